@@ -0,0 +1,465 @@
+"""Benchmark suite covering the hot paths of envier.
+
+Usage::
+
+    python -m benchmarks [--quick] [--json FILE] [--compare FILE] [PATTERN ...]
+
+Each benchmark reports the best time per operation, the cost per variable
+where it applies, and the peak memory allocated by a single operation. Only
+the benchmarks whose name contains one of the given patterns are run. Results
+can be saved as JSON and compared against a previous run to spot regressions.
+"""
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+import typing as t
+import warnings
+
+from benchmarks.common import bench
+from benchmarks.common import make_collection_spec
+from benchmarks.common import make_deprecated_spec
+from benchmarks.common import make_dynamic_spec
+from benchmarks.common import make_nested_spec
+from benchmarks.common import make_source
+from benchmarks.common import make_spec
+from benchmarks.common import make_union_spec
+from benchmarks.common import peak_memory
+from benchmarks.common import retained_memory
+from envier import Env
+from envier import IntArray
+
+
+SIZES = (10, 100, 1_000, 10_000)
+
+Result = t.Dict[str, t.Any]
+BENCHMARKS: t.List[t.Tuple[str, t.Callable[[int], t.Iterator[Result]]]] = []
+
+
+def benchmark(
+    name: str,
+) -> t.Callable[
+    [t.Callable[[int], t.Iterator[Result]]], t.Callable[[int], t.Iterator[Result]]
+]:
+    def register(
+        func: t.Callable[[int], t.Iterator[Result]]
+    ) -> t.Callable[[int], t.Iterator[Result]]:
+        BENCHMARKS.append((name, func))
+        return func
+
+    return register
+
+
+def measure(
+    name: str,
+    func: t.Callable[[], t.Any],
+    repeat: int,
+    variables: t.Optional[int] = None,
+) -> Result:
+    seconds = bench(func, repeat)
+    return {
+        "name": name,
+        "seconds": seconds,
+        "per_variable": seconds / variables if variables else None,
+        "peak_bytes": peak_memory(func),
+    }
+
+
+@benchmark("init")
+def bench_init(repeat: int) -> t.Iterator[Result]:
+    for n in SIZES:
+        spec = make_spec(n)
+        source = make_source(spec)
+        yield measure(f"init[{n}]", lambda: spec(source), repeat, n)
+
+    spec = make_spec(1_000)
+    source = make_source(spec)
+    spec.__codegen__ = False
+    yield measure("init[1000,generic]", lambda: spec(source), repeat, 1_000)
+    spec.__codegen__ = True
+    yield measure("init[1000,lazy]", lambda: spec(source, lazy=True), repeat, 1_000)
+    spec.__instrumented__ = True
+    yield measure("init[1000,instrumented]", lambda: spec(source), repeat, 1_000)
+    spec.__instrumented__ = False
+
+
+@benchmark("init_nested")
+def bench_nested(repeat: int) -> t.Iterator[Result]:
+    for depth in (10, 50):
+        spec = make_nested_spec(depth)
+        source = make_source(spec)
+        yield measure(
+            f"init_nested[depth={depth}]", lambda: spec(source), repeat, depth * 5
+        )
+
+
+@benchmark("init_deprecations")
+def bench_deprecations(repeat: int) -> t.Iterator[Result]:
+    spec = make_deprecated_spec(1_000)
+    # An empty source would fall back to os.environ.
+    source = {"UNRELATED": "1"}
+    yield measure("init_deprecations[unset]", lambda: spec(source), repeat, 1_000)
+
+    # Every variable is set through its last deprecated alias.
+    source = {v._deprecated[-1][0]: "42" for v in spec.values()}  # type: ignore[union-attr]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        yield measure("init_deprecations[aliased]", lambda: spec(source), repeat, 1_000)
+
+
+@benchmark("init_collections")
+def bench_collections(repeat: int) -> t.Iterator[Result]:
+    class Collections(Env):
+        items = Env.var(list, "items", map=int, default=[])
+        mapping = Env.var(dict, "mapping", default={})
+
+    for size in (1_000, 100_000):
+        source = {
+            "ITEMS": ",".join(str(i) for i in range(size)),
+            "MAPPING": ",".join(f"k{i}:{i}" for i in range(size)),
+        }
+        yield measure(f"init_collections[{size}]", lambda: Collections(source), repeat)
+
+
+@benchmark("init_unions")
+def bench_unions(repeat: int) -> t.Iterator[Result]:
+    spec = make_union_spec(1_000)
+    values = ("42", "4.2", "hello")
+    source = {
+        v.full_name: values[i % 3] if i % 2 == 0 else "7"  # type: ignore[union-attr]
+        for i, v in enumerate(spec.values())
+    }
+    yield measure("init_unions[1000]", lambda: spec(source), repeat, 1_000)
+
+
+@benchmark("retrieve")
+def bench_retrieve(repeat: int) -> t.Iterator[Result]:
+    class Config(Env):
+        flag = Env.var(bool, "flag", default=False)
+        number = Env.var(int, "number", default=0)
+        items = Env.var(list, "items", map=int, default=[])
+        mapping = Env.var(dict, "mapping", default={})
+        union = Env.var(t.Union[int, float, str], "union", default=0)
+
+    source = {
+        "FLAG": "true",
+        "NUMBER": "42",
+        "ITEMS": "1,2,3",
+        "MAPPING": "a:1,b:2",
+        "UNION": "4.2",
+    }
+    env = Config(source)
+    for name in ("flag", "number", "items", "mapping", "union"):
+        v = getattr(Config, name)
+        raw = source[v.full_name]
+        yield measure(f"retrieve[{name}]", lambda: v(env, ""), repeat, 1)
+        yield measure(f"cast[{name}]", lambda: v._cast(raw, env), repeat, 1)
+
+    yield measure("read", lambda: env.number, repeat)
+    Config.__track_reads__ = True
+    tracked = Config(source)
+    yield measure("read[tracked]", lambda: tracked.number, repeat)
+
+
+@benchmark("load_for")
+def bench_load_for(repeat: int) -> t.Iterator[Result]:
+    spec = make_dynamic_spec(1_000)
+    source = make_source(spec)
+    for n in (10, 100):
+        dynamics = [{"tenant": f"t{i}"} for i in range(n)]
+        source.update({f"BENCH_T{i}_STR_0": "hello" for i in range(n)})
+        yield measure(
+            f"load_for[contexts={n},loop]",
+            lambda: [spec(source, dynamic=d) for d in dynamics],
+            repeat,
+        )
+        yield measure(
+            f"load_for[contexts={n}]",
+            lambda: spec.load_for(dynamics, source),
+            repeat,
+        )
+
+
+@benchmark("cached")
+def bench_cached(repeat: int) -> t.Iterator[Result]:
+    spec = make_dynamic_spec(1_000)
+    source = make_source(spec)
+    dynamics = [{"tenant": f"t{i}"} for i in range(100)]
+    yield measure(
+        "cached[contexts=100,uncached]",
+        lambda: [spec(source, dynamic=d) for d in dynamics],
+        repeat,
+    )
+    yield measure(
+        "cached[contexts=100]",
+        lambda: [spec.cached(source, dynamic=d) for d in dynamics],
+        repeat,
+    )
+
+
+@benchmark("items")
+def bench_items(repeat: int) -> t.Iterator[Result]:
+    spec = make_nested_spec(10, width=100)
+    yield measure(
+        "items[recursive]", lambda: list(spec.items(recursive=True)), repeat, 1_000
+    )
+    yield measure("keys[recursive]", lambda: list(spec.keys(recursive=True)), repeat)
+    yield measure(
+        "values[recursive]", lambda: list(spec.values(recursive=True)), repeat
+    )
+
+
+@benchmark("include")
+def bench_include(repeat: int) -> t.Iterator[Result]:
+    # Including mutates the target, so each run needs fresh specs.
+    for n in (10, 100, 1_000):
+        rounds = max(1, 2_000 // n)
+        specs = [
+            (make_spec(0, "target", "Target"), make_spec(n, "other", "Other"))
+            for _ in range(rounds)
+        ]
+        start = time.perf_counter()
+        for target, other in specs:
+            target.include(other)
+        seconds = (time.perf_counter() - start) / rounds
+        yield {
+            "name": f"include[{n}]",
+            "seconds": seconds,
+            "per_variable": seconds / n,
+            "peak_bytes": None,
+        }
+
+
+@benchmark("help_info")
+def bench_help_info(repeat: int) -> t.Iterator[Result]:
+    spec = make_nested_spec(10, width=100)
+    yield measure(
+        "help_info[recursive]",
+        lambda: spec.help_info(recursive=True),
+        repeat,
+        1_000,
+    )
+
+
+@benchmark("reload")
+def bench_reload(repeat: int) -> t.Iterator[Result]:
+    spec = make_spec(1_000)
+    env = spec(make_source(spec))
+    yield measure("reload[unchanged]", env.reload, repeat, 1_000)
+
+
+@benchmark("declared")
+def bench_declared(repeat: int) -> t.Iterator[Result]:
+    spec = make_deprecated_spec(1_000)
+    for size in (1_000, 10_000):
+        # A few declared names lost among many unrelated ones.
+        source = {f"UNRELATED_{i}": "1" for i in range(size)}
+        source.update(make_source(spec, 0.1))
+        yield measure(
+            f"declared[environ={size}]", lambda: spec.declared(source), repeat
+        )
+
+
+@benchmark("unknown")
+def bench_unknown(repeat: int) -> t.Iterator[Result]:
+    for n in (100, 1_000):
+        spec = make_spec(n)
+        source = {f"UNRELATED_{i}": "1" for i in range(10_000)}
+        source.update(make_source(spec))
+        yield measure(f"unknown[spec={n},clean]", lambda: spec.unknown(source), repeat)
+
+        # Misspelled names among many similar ones is the worst case for the
+        # suggestions, as few branches of the trie can be pruned.
+        source.update({f"BENCH_INT_{i}X": "1" for i in range(0, 40, 4)})
+        yield measure(
+            f"unknown[spec={n},typos=10]", lambda: spec.unknown(source), repeat
+        )
+
+
+@benchmark("snapshot")
+def bench_snapshot(repeat: int) -> t.Iterator[Result]:
+    for n in (100, 1_000, 10_000):
+        spec = make_spec(n)
+        source = make_source(spec)
+        snapshot = spec(source).snapshot()
+        yield measure(f"snapshot[{n}]", spec(source).snapshot, repeat, n)
+        yield measure(
+            f"from_snapshot[{n}]",
+            lambda: spec.from_snapshot(snapshot, source),
+            repeat,
+            n,
+        )
+        data = pickle.dumps(snapshot)
+        yield measure(
+            f"from_snapshot[{n},unpickle]",
+            lambda: spec.from_snapshot(pickle.loads(data), source),
+            repeat,
+            n,
+        )
+
+
+@benchmark("cold")
+def bench_cold(repeat: int) -> t.Iterator[Result]:
+    # The first load in a fresh process, with and without the file cache.
+    with tempfile.TemporaryDirectory() as directory:
+        for n in (1_000, 10_000):
+            path = os.path.join(directory, f"spec{n}.cache")
+            for name, load in (
+                (f"cold[{n}]", "spec(source)"),
+                (f"cold[{n},file]", f"spec.file_cached({path!r}, source)"),
+            ):
+                code = (
+                    "import time; "
+                    "from benchmarks.common import make_source, make_spec; "
+                    f"spec = make_spec({n}); source = make_source(spec); "
+                    f"start = time.perf_counter(); {load}; "
+                    "print(time.perf_counter() - start)"
+                )
+                # The first run writes the cache file.
+                subprocess.check_output([sys.executable, "-c", code])
+                seconds = min(
+                    float(subprocess.check_output([sys.executable, "-c", code]))
+                    for _ in range(max(repeat, 3))
+                )
+                yield {
+                    "name": name,
+                    "seconds": seconds,
+                    "per_variable": seconds / n,
+                    "peak_bytes": None,
+                }
+
+
+@benchmark("collections")
+def bench_large_collections(repeat: int) -> t.Iterator[Result]:
+    # Parsing large collections, e.g. host allowlists or tag maps.
+    for size in (10_000, 100_000):
+        hosts = ",".join(f"host{i}.example.com" for i in range(size))
+        ints = ",".join(str(i * 7) for i in range(size))
+        tags = ",".join(f"tag{i}:value{i}" for i in range(size))
+        for name, var, raw in (
+            ("list", Env.var(list, "v"), hosts),
+            ("tuple", Env.var(tuple, "v"), hosts),
+            ("set", Env.var(set, "v"), hosts),
+            ("list,map", Env.var(list, "v", map=int), ints),
+            ("IntArray", Env.var(IntArray, "v"), ints),
+            ("range", Env.var(range, "v"), f"0-{size - 1}"),
+            ("dict", Env.var(dict, "v"), tags),
+            ("dict,map", Env.var(dict, "v", map=lambda k, v: (k, v.upper())), tags),
+        ):
+            spec = type("Collection", (Env,), {"v": var})
+            source = {"V": raw}
+            # The cost per item is reported as the cost per variable.
+            yield measure(
+                f"collections[{size},{name}]", lambda: spec(source), repeat, size
+            )
+
+
+@benchmark("shared")
+def bench_shared(repeat: int) -> t.Iterator[Result]:
+    # The cost of each worker process holding large collections.
+    for size in (1_000, 10_000):
+        spec, source = make_collection_spec(6, size)
+        data = pickle.dumps(spec(source).snapshot())
+        memory = spec(source).publish()
+        try:
+            for name, func in (
+                (f"shared[{size},load]", lambda: spec(source)),
+                (
+                    f"shared[{size},snapshot]",
+                    lambda: spec.from_snapshot(pickle.loads(data), source),
+                ),
+                (f"shared[{size},attach]", lambda: spec.attach(memory.name, source)),
+            ):
+                result = measure(name, func, repeat)
+                result["peak_bytes"] = retained_memory(func)
+                yield result
+        finally:
+            memory.close()
+            memory.unlink()
+
+
+@benchmark("memory")
+def bench_memory(repeat: int) -> t.Iterator[Result]:
+    # The footprint of a spec and of its instances, rather than a time.
+    for n in (100, 1_000):
+        spec = make_spec(n)
+        source = make_source(spec)
+        spec(source)  # Generate the loader beforehand
+        for name, func, count in (
+            (f"memory[spec={n}]", lambda: make_spec(n), 1),
+            (f"memory[instance={n}]", lambda: [spec(source) for _ in range(100)], 100),
+        ):
+            yield {
+                "name": name,
+                "seconds": None,
+                "per_variable": None,
+                "peak_bytes": retained_memory(func) // count,
+            }
+
+
+@benchmark("import")
+def bench_import(repeat: int) -> t.Iterator[Result]:
+    code = (
+        "import time; start = time.perf_counter(); import envier; "
+        "print(time.perf_counter() - start)"
+    )
+    seconds = min(
+        float(subprocess.check_output([sys.executable, "-c", code]))
+        for _ in range(max(repeat, 3))
+    )
+    yield {
+        "name": "import",
+        "seconds": seconds,
+        "per_variable": None,
+        "peak_bytes": None,
+    }
+
+
+def format_result(result: Result, previous: t.Optional[Result]) -> str:
+    seconds = result["seconds"]
+    line = f"{result['name']:<32} "
+    line += f"{seconds * 1e6:>14.2f} us" if seconds is not None else " " * 17
+    per_variable = result["per_variable"]
+    line += f" {per_variable * 1e9:>12.1f} ns/var" if per_variable else " " * 20
+    peak = result["peak_bytes"]
+    line += f" {peak / 1024:>12.1f} KiB" if peak is not None else " " * 17
+    if previous is not None:
+        # Memory only results are compared by footprint.
+        key = "seconds" if seconds is not None else "peak_bytes"
+        line += f"  {previous[key] / result[key]:>6.2f}x"
+    return line
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("patterns", nargs="*", help="run only matching benchmarks")
+    parser.add_argument("--quick", action="store_true", help="single repetition")
+    parser.add_argument("--json", help="save the results to this file")
+    parser.add_argument("--compare", help="compare with the results in this file")
+    args = parser.parse_args()
+
+    previous: t.Dict[str, Result] = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = {r["name"]: r for r in json.load(f)}
+
+    repeat = 1 if args.quick else 5
+    results = []
+    for name, func in BENCHMARKS:
+        if args.patterns and not any(p in name for p in args.patterns):
+            continue
+        for result in func(repeat):
+            print(format_result(result, previous.get(result["name"])), flush=True)
+            results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
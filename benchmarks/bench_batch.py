@@ -0,0 +1,55 @@
+"""Round trips to a slow source, with and without batch retrieval.
+
+The fake source injects a fixed latency on each call, as a remote key-value
+store would. Without ``get_many``, every variable costs one round trip, plus
+one for each deprecated alias when the variable is not set. With it, the whole
+tree is retrieved in a single call.
+"""
+import time
+import typing as t
+
+from benchmarks.common import make_source
+from benchmarks.common import make_spec
+from benchmarks.common import report
+
+
+LATENCY = 0.0005
+
+
+class SlowSource:
+    def __init__(self, data: t.Dict[str, str]) -> None:
+        self.data = data
+        self.round_trips = 0
+
+    def get(self, key: str, default: t.Optional[str] = None) -> t.Optional[str]:
+        self.round_trips += 1
+        time.sleep(LATENCY)
+        return self.data.get(key, default)
+
+
+class SlowBatchSource(SlowSource):
+    def get_many(self, keys: t.Iterable[str]) -> t.Dict[str, str]:
+        self.round_trips += 1
+        time.sleep(LATENCY)
+        return {k: self.data[k] for k in keys if k in self.data}
+
+
+def main() -> None:
+    for n in (10, 100, 500):
+        spec = make_spec(n)
+        data = make_source(spec)
+
+        results = []
+        for source_type in (SlowSource, SlowBatchSource):
+            source = source_type(data)
+            start = time.perf_counter()
+            spec(source)  # type: ignore[arg-type]
+            results.append((time.perf_counter() - start, source.round_trips))
+
+        (baseline, trips), (batched, batch_trips) = results
+        report(f"per-key get ({n} variables, {trips} trips)", baseline)
+        report(f"get_many ({n} variables, {batch_trips} trips)", batched, baseline)
+
+
+if __name__ == "__main__":
+    main()
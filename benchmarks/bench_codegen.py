@@ -0,0 +1,29 @@
+"""Instantiation cost of the generated loaders.
+
+Compares the straight-line loader that is generated for each Env subclass with
+the generic loop over the load plan, which is used when ``__codegen__`` is
+``False``.
+"""
+from benchmarks.common import bench
+from benchmarks.common import make_source
+from benchmarks.common import make_spec
+from benchmarks.common import report
+
+
+def main() -> None:
+    for n in (10, 100, 500):
+        spec = make_spec(n)
+        source = make_source(spec)
+
+        spec.__codegen__ = False
+        baseline = bench(lambda: spec(source))
+        report(f"generic loop ({n} variables)", baseline)
+
+        spec.__codegen__ = True
+        report(
+            f"generated loader ({n} variables)", bench(lambda: spec(source)), baseline
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Unique memory of forked workers reading a large configuration.
+
+The parent loads the configuration, then forks workers that read all of its
+values, as the workers of a prefork server would, and run a garbage
+collection. Each worker reports its unique set size (USS), i.e. the memory
+private to the process, right after the fork and after reading: the
+difference is made of the pages of the parent that were copied on write.
+The configuration is measured as loaded, and frozen with
+``Env.freeze(gc_freeze=True)``. Linux only.
+"""
+import gc
+import os
+import sys
+import typing as t
+
+from benchmarks.common import make_collection_spec
+from envier import Env
+
+
+WORKERS = 4
+
+
+def uss(pid: int) -> int:
+    """Return the unique set size of a process, in bytes."""
+    total = 0
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1]) * 1024
+    return total
+
+
+def read(config: Env) -> None:
+    for _, env in config._tree():
+        for name, _ in env.items(include_derived=True):
+            value = getattr(env, name)
+            if isinstance(value, (tuple, list)):
+                value.count(None)
+            elif isinstance(value, (set, frozenset)):
+                None in value
+            elif hasattr(value, "values"):
+                sum(1 for _ in value.values())
+
+
+def fork_worker(config: Env) -> t.Tuple[int, int]:
+    """Fork a worker reading the configuration, and return its USS before and
+    after reading.
+    """
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        before = uss(os.getpid())
+        read(config)
+        gc.collect()
+        after = uss(os.getpid())
+        os.write(w, f"{before} {after}".encode())
+        os._exit(0)
+
+    os.close(w)
+    with os.fdopen(r) as f:
+        before, after = map(int, f.read().split())
+    os.waitpid(pid, 0)
+    return before, after
+
+
+def measure(label: str, config: Env) -> None:
+    results = [fork_worker(config) for _ in range(WORKERS)]
+    before = sum(b for b, _ in results) / len(results)
+    after = sum(a for _, a in results) / len(results)
+    print(
+        f"{label:<24} {before / 2**20:>8.1f} MiB after fork "
+        f"{after / 2**20:>8.1f} MiB after reading "
+        f"(+{(after - before) / 2**20:.1f} MiB per worker)"
+    )
+
+
+def main() -> None:
+    if not os.path.exists(f"/proc/{os.getpid()}/smaps_rollup"):
+        print("Unique set sizes can only be measured on Linux")
+        sys.exit(1)
+
+    for size in (10_000, 100_000):
+        spec, source = make_collection_spec(12, size)
+        measure(f"loaded[{size}]", spec(source))
+        try:
+            measure(f"frozen[{size}]", spec(source).freeze(gc_freeze=True))
+        finally:
+            gc.unfreeze()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Instantiation cost of the compiled load plan.
+
+Compares ``Env.__init__``, which runs the load plan compiled by ``EnvMeta``,
+with the former approach of scanning the class ``__dict__`` and dispatching on
+the type of every attribute on each instantiation. The former approach is
+reproduced here in full, retrieval and casting included, so that it does not
+depend on the current internals of the variables.
+"""
+import os
+import typing as t
+
+from benchmarks.common import bench
+from benchmarks.common import make_source
+from benchmarks.common import make_spec
+from benchmarks.common import report
+from envier.env import DerivedVariable
+from envier.env import Env
+from envier.env import EnvVariable
+from envier.env import NoDefaultType
+from envier.env import _check_type
+from envier.env import _normalized
+
+
+def scan_cast(v: EnvVariable, _type: t.Any, raw: str, env: Env) -> t.Any:
+    """The former EnvVariable._cast, which dispatches on the type."""
+    if _type is bool:
+        return raw.lower() in env.__truthy__
+    elif _type in (list, tuple, set):
+        collection = raw.split(env.__item_separator__)
+        return _type(collection if v.map is None else map(v.map, collection))
+    elif _type is dict:
+        d = dict(
+            _.split(env.__value_separator__, 1)
+            for _ in raw.split(env.__item_separator__)
+        )
+        if v.map is not None:
+            d = dict(v.map(*_) for _ in d.items())
+        return d
+
+    if _check_type(raw, _type):
+        return raw
+
+    try:
+        return _type(raw)
+    except Exception as e:
+        raise TypeError(f"cannot cast {raw} to {v.type}") from e
+
+
+def scan_retrieve(v: EnvVariable, env: Env, prefix: str) -> t.Any:
+    """The former EnvVariable.__call__, without the deprecated names."""
+    raw = env.source.get(v.full_name.format(**env.dynamic))
+    if raw is None:
+        if not isinstance(v.default, NoDefaultType):
+            return v.default
+        raise KeyError(f"Mandatory environment variable {v.full_name} is not set")
+
+    if v.parser is not None:
+        value = v.parser(raw)
+    else:
+        value = scan_cast(v, v.type, raw, env)
+
+    if v.validator is not None:
+        try:
+            v.validator(value)
+        except ValueError as e:
+            msg = f"Invalid value for environment variable {v.full_name}: {e}"
+            raise ValueError(msg)
+
+    return value
+
+
+def scan_init(env: Env, source) -> None:
+    """The former Env.__init__, which scans the class __dict__."""
+    # The former Env had no __setattr__, so the attributes are written to the
+    # instance dictionary directly.
+    values = env.__dict__
+    values["source"] = source or os.environ
+    values["parent"] = None
+    values["dynamic"] = {}
+
+    full_prefix = _normalized(env.__prefix__)
+    if full_prefix and not full_prefix.endswith("_"):
+        full_prefix += "_"
+    values["_full_prefix"] = full_prefix
+
+    values["spec"] = env.__class__
+    derived = []
+    for name, e in list(env.__class__.__dict__.items()):
+        if isinstance(e, EnvVariable):
+            values[name] = scan_retrieve(e, env, full_prefix)
+        elif isinstance(e, type) and issubclass(e, Env):
+            values[name] = e(source, env)
+        elif isinstance(e, DerivedVariable):
+            derived.append((name, e))
+
+    for n, d in derived:
+        values[n] = d.derivation(env)
+
+
+def main() -> None:
+    for n in (10, 100, 500):
+        spec = make_spec(n)
+        source = make_source(spec)
+
+        def scan():
+            scan_init(spec.__new__(spec), source)
+
+        baseline = bench(scan)
+        report(f"scan __dict__ ({n} variables)", baseline)
+        report(f"load plan ({n} variables)", bench(lambda: spec(source)), baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Helpers shared by the envier benchmarks.
+
+The benchmarks are plain scripts that only depend on the standard library.
+Run them from the root of the repository, e.g.::
+
+    python -m benchmarks.bench_init
+
+or run the whole suite with ``python -m benchmarks``.
+"""
+import timeit
+import tracemalloc
+import typing as t
+
+from envier import Env
+
+
+def make_spec(n: int, prefix: str = "bench", name: str = "Spec") -> t.Type[Env]:
+    """Generate an Env subclass declaring ``n`` variables of mixed types."""
+    ns: t.Dict[str, t.Any] = {"__prefix__": prefix}
+    for i in range(n):
+        kind = i % 4
+        if kind == 0:
+            ns[f"v{i}"] = Env.var(int, f"int.{i}", default=i)
+        elif kind == 1:
+            ns[f"v{i}"] = Env.var(str, f"str.{i}", default=str(i))
+        elif kind == 2:
+            ns[f"v{i}"] = Env.var(bool, f"bool.{i}", default=False)
+        else:
+            ns[f"v{i}"] = Env.var(list, f"list.{i}", map=int, default=[])
+
+    return type(f"{name}{n}", (Env,), ns)
+
+
+def make_source(spec: t.Type[Env], ratio: float = 0.5) -> t.Dict[str, str]:
+    """Generate a source that sets the given ratio of the spec variables."""
+    values = {int: "42", str: "hello", bool: "true", list: "1,2,3"}
+    source = {}
+    variables = [v for v in spec.values(recursive=True)]
+    for v in variables[: int(len(variables) * ratio)]:
+        source[v.full_name] = values[v.type]  # type: ignore[union-attr,index]
+
+    return source
+
+
+def bench(func: t.Callable[[], t.Any], repeat: int = 5) -> float:
+    """Return the best time per call, in seconds."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def report(label: str, seconds: float, baseline: t.Optional[float] = None) -> None:
+    line = f"{label:<40} {seconds * 1e6:>12.2f} us"
+    if baseline is not None:
+        line += f"  ({baseline / seconds:.2f}x)"
+    print(line)
+
+
+def make_nested_spec(depth: int, width: int = 5) -> t.Type[Env]:
+    """Generate a chain of ``depth`` nested Env subclasses."""
+    spec = None
+    for level in reversed(range(depth)):
+        ns: t.Dict[str, t.Any] = {"__prefix__": f"l{level}"}
+        for i in range(width):
+            ns[f"v{i}"] = Env.var(int, f"int.{i}", default=i)
+        if spec is not None:
+            ns["nested"] = spec
+        spec = type(f"Level{level}", (Env,), ns)
+
+    return t.cast(t.Type[Env], spec)
+
+
+def make_deprecated_spec(n: int, aliases: int = 3) -> t.Type[Env]:
+    """Generate a spec whose variables have deprecated aliases."""
+    ns: t.Dict[str, t.Any] = {"__prefix__": "bench"}
+    for i in range(n):
+        deprecations = [(f"old{j}.{i}", "1.0", "2.0") for j in range(aliases)]
+        ns[f"v{i}"] = Env.var(int, f"int.{i}", default=i, deprecations=deprecations)
+
+    return type(f"Deprecated{n}", (Env,), ns)
+
+
+def make_union_spec(n: int) -> t.Type[Env]:
+    """Generate a spec with union-typed variables."""
+    ns: t.Dict[str, t.Any] = {"__prefix__": "bench"}
+    for i in range(n):
+        if i % 2:
+            ns[f"v{i}"] = Env.var(t.Optional[int], f"opt.{i}", default=None)
+        else:
+            ns[f"v{i}"] = Env.var(t.Union[int, float, str], f"union.{i}", default=0)
+
+    return type(f"Union{n}", (Env,), ns)
+
+
+def make_dynamic_spec(n: int, dynamic: int = 10) -> t.Type[Env]:
+    """Generate a spec where ``dynamic`` of the ``n`` variables have a dynamic
+    name.
+    """
+    spec = make_spec(n - dynamic, name="Dynamic")
+    for i in range(dynamic):
+        setattr(spec, f"d{i}", Env.var(str, f"{{tenant}}.str.{i}", default=""))
+
+    return spec
+
+
+def peak_memory(func: t.Callable[[], t.Any]) -> int:
+    """Return the peak memory allocated by a single call, in bytes."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def retained_memory(func: t.Callable[[], t.Any]) -> int:
+    """Return the memory still allocated by a single call, while its result
+    is alive, in bytes.
+    """
+    tracemalloc.start()
+    try:
+        result = func()  # noqa: F841
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def make_collection_spec(n: int, size: int) -> t.Tuple[t.Type[Env], t.Dict[str, str]]:
+    """Generate a spec with ``n`` large collections of ``size`` items each,
+    and a source setting them.
+    """
+    ns: t.Dict[str, t.Any] = {"__prefix__": "bench"}
+    source = {}
+    for i in range(n):
+        kind = i % 3
+        if kind == 0:
+            ns[f"v{i}"] = Env.var(list, f"hosts.{i}", default=[])
+            source[f"BENCH_HOSTS_{i}"] = ",".join(
+                f"host{j}.example.com" for j in range(size)
+            )
+        elif kind == 1:
+            ns[f"v{i}"] = Env.var(list, f"ints.{i}", map=int, default=[])
+            source[f"BENCH_INTS_{i}"] = ",".join(str(j * 7) for j in range(size))
+        else:
+            ns[f"v{i}"] = Env.var(dict, f"tags.{i}", default={})
+            source[f"BENCH_TAGS_{i}"] = ",".join(
+                f"tag{j}:value{j}" for j in range(size)
+            )
+
+    return type(f"Collections{n}", (Env,), ns), source
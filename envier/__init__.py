@@ -1,6 +1,9 @@
+from envier.env import BatchSource
 from envier.env import Env
+from envier.env import FloatArray
 from envier.env import HelpInfo
+from envier.env import IntArray
 
 
 En = Env
-__all__ = ["En", "Env", "HelpInfo"]
+__all__ = ["BatchSource", "En", "Env", "FloatArray", "HelpInfo", "IntArray"]
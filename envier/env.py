@@ -1,6 +1,20 @@
+import array
+from bisect import bisect_left
+from collections import OrderedDict
 from collections import deque
 from collections import namedtuple
+import gc
+from itertools import accumulate
+from itertools import chain
+from operator import eq
+from operator import itemgetter
 import os
+import re
+import string
+import threading
+import time
+from types import MappingProxyType
+from types import MethodType
 import typing as t
 import warnings
 
@@ -19,13 +33,209 @@ K = t.TypeVar("K")
 V = t.TypeVar("V")
 
 MapType = t.Union[t.Callable[[str], V], t.Callable[[str, str], t.Tuple[K, V]]]
+Caster = t.Callable[[str, "Env"], t.Any]
 HelpInfo = namedtuple("HelpInfo", ("name", "type", "default", "help"))
+CacheInfo = namedtuple("CacheInfo", ("hits", "misses", "maxsize", "currsize"))
+IndexEntry = namedtuple("IndexEntry", ("path", "item", "owner"))
+SpecIndex = namedtuple("SpecIndex", ("entries", "by_path", "by_name", "dynamic"))
+LoadPlan = namedtuple("LoadPlan", ("variables", "nested", "derived", "relocations"))
+AccessReport = namedtuple("AccessReport", ("never_read", "most_read"))
+# The layout of the snapshots of an Env subclass: the fingerprint of the spec,
+# the names of the variables and derived items of each Env of the tree, by
+# path prefix, and the names of the variables in the source.
+_SnapshotSpec = namedtuple(
+    "_SnapshotSpec", ("fingerprint", "layout", "static_keys", "dynamic_keys")
+)
+Snapshot = namedtuple(
+    "Snapshot", ("version", "spec", "source", "dynamic", "values", "raws", "deps")
+)
+LoadStats = namedtuple(
+    "LoadStats",
+    ("path", "name", "origin", "start", "lookup", "cast", "validate", "derive"),
+)
+
+
+# The version of the Snapshot layout, bumped on incompatible changes.
+_SNAPSHOT_VERSION = 1
+
+# The header of the snapshot files, followed by the digest of the payload.
+_SNAPSHOT_MAGIC = b"envier-snapshot\n"
+
+# The header of the shared memory segments, followed by the offset and the size
+# of the pickled snapshot.
+_SHARED_MAGIC = b"envier-shared\n\0\0"
+_SHARED_HEADER_SIZE = len(_SHARED_MAGIC) + 16
+
+# Arrays of numbers or strings in a shared memory segment. Numbers are stored
+# at the given offset. Strings are stored as the UTF-8 encoded data at the
+# given data offset, delimited by the (length + 1) offsets stored at the given
+# offset.
+_SharedArray = namedtuple("_SharedArray", ("code", "offset", "length", "data"))
+# Placeholders for the collections published to shared memory. The values are
+# only set for mappings, and aligned with their sorted keys.
+_SharedValue = namedtuple("_SharedValue", ("kind", "items", "values"))
+
+# Incremented every time the structure of any Env subclass, or the name of any
+# variable, changes. Generated code is checked against it before being reused.
+_generation = 0
+
+
+def _invalidate() -> None:
+    global _generation
+
+    _generation += 1
 
 
 def _normalized(name: str) -> str:
     return name.upper().replace(".", "_").rstrip("_")
 
 
+def _compile_template(template: str) -> t.Callable[[t.Dict[str, str]], str]:
+    """Compile a dynamic name into a function of the dynamic values.
+
+    The function is equivalent to ``template.format(**dynamic)``, but the
+    template is only parsed once.
+    """
+    parsed = list(string.Formatter().parse(template))
+    fields = [field for _, field, _, _ in parsed if field is not None]
+    if not fields or any(
+        spec or conversion or not field.isidentifier()
+        for _, field, spec, conversion in parsed
+        if field is not None
+    ):
+        return lambda dynamic: template.format(**dynamic)
+
+    pattern = "".join(
+        literal.replace("%", "%%") + ("%s" if field is not None else "")
+        for literal, field, _, _ in parsed
+    )
+    if len(fields) == 1:
+        (field,) = fields
+        return lambda dynamic: pattern % (dynamic[field],)
+
+    get = itemgetter(*fields)
+    return lambda dynamic: pattern % get(dynamic)
+
+
+class _NumberArray(array.array):
+    """An array of numbers of a fixed type."""
+
+    __slots__ = ()
+
+    _code: t.ClassVar[str]
+    _item: t.ClassVar[t.Callable[[str], t.Any]]
+
+    def __new__(cls, items: t.Iterable[t.Any] = ()) -> "_NumberArray":
+        return super().__new__(cls, cls._code, items)  # type: ignore[call-arg]
+
+    def __copy__(self) -> "_NumberArray":
+        return type(self)(self)
+
+    def __deepcopy__(self, memo: t.Dict[int, t.Any]) -> "_NumberArray":
+        return type(self)(self)
+
+    def __reduce_ex__(
+        self, protocol: t.SupportsIndex
+    ) -> t.Union[str, t.Tuple[t.Any, ...]]:
+        if int(protocol) >= 3:
+            # The reconstructor of array.array keeps the subclass.
+            return super().__reduce_ex__(protocol)
+        # array.array would pass its type code to the constructor.
+        return type(self), (self.tolist(),)
+
+
+class IntArray(_NumberArray):
+    """An array of 64-bit signed integers, parsed from a list of integers."""
+
+    __slots__ = ()
+
+    _code = "q"
+    _item = int
+
+
+class FloatArray(_NumberArray):
+    """An array of double precision floats, parsed from a list of floats."""
+
+    __slots__ = ()
+
+    _code = "d"
+    _item = float
+
+
+# Inclusive ranges of integers, e.g. 8000-8999, or single integers.
+_RANGE_PATTERN = re.compile(r"\s*([+-]?\d+)\s*(?:-\s*([+-]?\d+)\s*)?")
+
+# Supersets of the syntax accepted by the int and float constructors, used to
+# skip numeric members of a union without attempting the cast.
+_NUMBER_PATTERNS = {
+    int: re.compile(r"\s*[+-]?\d[\d_]*\s*"),
+    float: re.compile(
+        r"\s*[+-]?(?:(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d[\d_]*)?"
+        r"|inf|infinity|nan)\s*",
+        re.IGNORECASE,
+    ),
+}
+_COLLECTIONS = frozenset({bool, list, tuple, set, frozenset, dict, array.array})
+_UNION_CACHE_SIZE = 1024
+# The mutable collections, with the function that copies them.
+_MUTABLE_COLLECTIONS: t.Dict[type, t.Callable[[t.Any], t.Any]] = {
+    list: list.copy,
+    set: set.copy,
+    dict: dict.copy,
+    array.array: array.array.__copy__,
+    IntArray: IntArray.__copy__,
+    FloatArray: FloatArray.__copy__,
+}
+# The types of the items that collections can share with their copies.
+_ATOMIC_TYPES = frozenset({type(None), bool, int, float, complex, str, bytes})
+# The collections that can be published to shared memory, by kind.
+_SHARED_KINDS: t.Dict[type, str] = {
+    list: "sequence",
+    tuple: "tuple",
+    set: "set",
+    frozenset: "frozenset",
+    dict: "mapping",
+    array.array: "sequence",
+    IntArray: "sequence",
+    FloatArray: "sequence",
+}
+# The codes of the arrays of numbers, by map.
+_ARRAY_CODES: t.Dict[t.Any, str] = {int: "q", float: "d"}
+# Larger raw values are split one chunk at a time.
+_SPLIT_CHUNK_SIZE = 1 << 16
+
+# Casters that do not depend on the variable, keyed by (type, declared type).
+_CASTERS: t.Dict[t.Tuple[t.Any, t.Any], Caster] = {}
+
+
+def _split(raw: str, separator: str) -> t.Iterable[str]:
+    """Split a raw value into its items.
+
+    Large values are split lazily, one chunk at a time, so that the items are
+    not all held at once in an intermediate list. Chunks end on a separator,
+    which must then be a single character so that its occurrences cannot
+    overlap.
+    """
+    if len(raw) <= _SPLIT_CHUNK_SIZE or len(separator) != 1:
+        return raw.split(separator)
+    return chain.from_iterable(_split_chunks(raw, separator))
+
+
+def _split_chunks(raw: str, separator: str) -> t.Iterator[t.List[str]]:
+    start = 0
+    while True:
+        end = raw.find(separator, start + _SPLIT_CHUNK_SIZE)
+        if end < 0:
+            yield raw[start:].split(separator)
+            return
+        yield raw[start:end].split(separator)
+        start = end + 1
+
+
+def _is_union(_type: t.Any) -> bool:
+    return getattr(_type, "__origin__", None) is t.Union
+
+
 def _check_type(value: t.Any, _type: t.Union[object, t.Type[T]]) -> bool:
     if hasattr(_type, "__origin__"):
         return isinstance(value, _type.__args__)  # type: ignore[attr-defined,union-attr]
@@ -33,7 +243,133 @@ def _check_type(value: t.Any, _type: t.Union[object, t.Type[T]]) -> bool:
     return isinstance(value, _type)  # type: ignore[arg-type]
 
 
+def _deep_copy(value: t.Any) -> t.Any:
+    from copy import deepcopy
+
+    return deepcopy(value)
+
+
+def _copier(value: t.Any) -> t.Optional[t.Callable[[t.Any], t.Any]]:
+    """Return the function that copies a collection for a new owner, if needed.
+
+    Collections of atomic items are copied shallowly if they are mutable, and
+    not at all otherwise. Nested collections are copied deeply.
+    """
+    _type = type(value)
+    copy = _MUTABLE_COLLECTIONS.get(_type)
+    if copy is None and _type is not tuple and _type is not frozenset:
+        return None
+    items = value.values() if _type is dict else value
+    if all(type(_) in _ATOMIC_TYPES for _ in items):
+        return copy
+    return _deep_copy
+
+
+class _LoadCache:
+    """Bounded LRU cache of the validated values of a variable.
+
+    Values are keyed by the raw value together with the truthy set and the
+    separators of the env that requested them. Collections are copied on the
+    way out, deeply if they hold other collections, so that callers cannot
+    alter the cached values.
+    """
+
+    def __init__(self, load: Caster, maxsize: int) -> None:
+        self.load = load
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[t.Tuple, t.Tuple[t.Any, t.Any]]" = OrderedDict()
+        self.hits = self.misses = 0
+
+    def __call__(self, raw: str, env: "Env") -> t.Any:
+        key = (raw, env.__truthy__, env.__item_separator__, env.__value_separator__)
+        entries = self.entries
+        try:
+            value, copy = entries[key]
+        except KeyError:
+            self.misses += 1
+            value = self.load(raw, env)
+            copy = _copier(value)
+            entries[key] = value, copy
+            if len(entries) > self.maxsize:
+                entries.popitem(last=False)
+        except TypeError:
+            # Unhashable key, e.g. a custom source returning lists
+            return self.load(raw, env)
+        else:
+            self.hits += 1
+            entries.move_to_end(key)
+
+        return copy(value) if copy is not None else value
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.entries))
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+
+_CachedInstance = namedtuple(
+    "_CachedInstance", ("structure", "fingerprint", "env", "expires")
+)
+
+
+class _InstanceCache:
+    """The instances of an Env subclass returned by Env.cached.
+
+    They are keyed by dynamic values and hash of the raw values of the
+    variables, which are compared on lookup. The
+    names of the variables, formatted with the dynamic values, are cached
+    along with the source keys they were formatted from.
+    """
+
+    def __init__(self) -> None:
+        self.entries: "OrderedDict[t.Tuple, _CachedInstance]" = OrderedDict()
+        self.names: "OrderedDict[t.Tuple, t.Tuple[t.Tuple[str, ...], t.List[str]]]" = (
+            OrderedDict()
+        )
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+
+class _LoadRecorder:
+    """Collects the load statistics of an instance tree."""
+
+    def __init__(self, hook: t.Optional[t.Callable[[LoadStats], None]]) -> None:
+        self.records: t.List[LoadStats] = []
+        self.hook = hook
+
+    def record(self, stats: LoadStats) -> None:
+        self.records.append(stats)
+        if self.hook is not None:
+            self.hook(stats)
+
+
 class EnvVariable(t.Generic[T]):
+    __slots__ = (
+        "type",
+        "name",
+        "parser",
+        "validator",
+        "map",
+        "default",
+        "deprecations",
+        "private",
+        "help",
+        "help_type",
+        "help_default",
+        "_env_name",
+        "_attr",
+        "_cast",
+        "_load",
+        "_deprecated",
+        "_dynamic",
+        "_templates",
+        "_deprecation_messages",
+        "_deprecation_hits",
+        "_deprecation_warned",
+    )
+
     def __init__(
         self,
         type: t.Union[object, t.Type[T]],
@@ -47,8 +383,9 @@ class EnvVariable(t.Generic[T]):
         help: t.Optional[str] = None,
         help_type: t.Optional[str] = None,
         help_default: t.Optional[str] = None,
+        cache: int = 0,
     ) -> None:
-        if hasattr(type, "__origin__") and type.__origin__ is t.Union:  # type: ignore[attr-defined,union-attr]
+        if _is_union(type):
             if not isinstance(default, type.__args__):  # type: ignore[attr-defined,union-attr]
                 raise TypeError(
                     "default must be either of these types {}".format(type.__args__)  # type: ignore[attr-defined,union-attr]
@@ -69,105 +406,366 @@ class EnvVariable(t.Generic[T]):
         self.help_type = help_type
         self.help_default = help_default
 
+        # Hits of the (deprecated, current) name pairs, and when each was last
+        # warned about. Created on the first hit.
+        self._deprecation_hits: t.Optional[t.Dict[t.Tuple[str, str], int]] = None
+        self._deprecation_warned: t.Optional[t.Dict[t.Tuple[str, str], float]] = None
+
         self._full_name = _normalized(name)  # Will be set by the EnvMeta metaclass
+        self._attr: t.Optional[str] = None  # The attribute name on the Env class
 
-    @property
-    def full_name(self) -> str:
-        return f"_{self._full_name}" if self.private else self._full_name
+        self._cast = self._build_cast()
+        self._load = self._build_load(cache)
 
-    def _cast(self, _type: t.Any, raw: str, env: "Env") -> t.Any:
-        if _type is bool:
-            return t.cast(T, raw.lower() in env.__truthy__)
-        elif _type in (list, tuple, set):
-            collection = raw.split(env.__item_separator__)
-            return t.cast(
-                T,
-                _type(  # type: ignore[operator]
-                    collection if self.map is None else map(self.map, collection)  # type: ignore[arg-type]
-                ),
+    @property
+    def _full_name(self) -> str:
+        return self._env_name
+
+    @_full_name.setter
+    def _full_name(self, value: str) -> None:
+        self._env_name = value
+
+        # The deprecated names share the prefix of the full name.
+        prefix = value[: len(value) - len(_normalized(self.name))]
+        private = "_" if self.private else ""
+        self._deprecated: t.Tuple[DeprecationInfo, ...] = tuple(
+            (f"{private}{prefix}{_normalized(name)}", deprecated_when, removed_when)
+            for name, deprecated_when, removed_when in self.deprecations or ()
+        )
+        # Dynamic names are compiled into functions of the dynamic values.
+        full_name = private + value
+        self._dynamic = "{" in full_name or any(
+            "{" in name for name, _, _ in self._deprecated
+        )
+        self._templates = (
+            tuple(
+                _compile_template(name)
+                for name in (full_name, *(name for name, _, _ in self._deprecated))
             )
-        elif _type is dict:
-            d = dict(
-                _.split(env.__value_separator__, 1)
-                for _ in raw.split(env.__item_separator__)
+            if self._dynamic
+            else ()
+        )
+
+        # The warning messages only depend on the names, so they are built
+        # once here rather than on every lookup.
+        self._deprecation_messages = tuple(
+            "%s has been deprecated%s%s. Use %s instead"
+            % (
+                name,
+                " in version %s" % deprecated_when
+                if deprecated_when is not None
+                else "",
+                " and will be removed in version %s" % removed_when
+                if removed_when is not None
+                else "",
+                full_name,
             )
-            if self.map is not None:
-                d = dict(self.map(*_) for _ in d.items())
-            return t.cast(T, d)
+            for name, deprecated_when, removed_when in self._deprecated
+        )
 
-        if _check_type(raw, _type):
-            return t.cast(T, raw)
+        _invalidate()
 
+    @property
+    def full_name(self) -> str:
+        return f"_{self._env_name}" if self.private else self._env_name
+
+    def __set_name__(self, owner: t.Type["Env"], name: str) -> None:
+        self._attr = name
+
+    def __get__(self, env: t.Optional["Env"], owner: t.Any = None) -> t.Any:
+        if env is None:
+            return self
+
+        name = t.cast(str, self._attr)
+        values = env.__dict__.get("_values")
+        if values is not None:
+            # Read tracking: the values are kept out of the instance dictionary
+            # so that every read goes through this descriptor.
+            reads = env._reads
+            reads[name] = reads.get(name, 0) + 1
+            if name in values:
+                return values[name]
+        elif not env._lazy:
+            return self
+        else:
+            values = env.__dict__
+
+        # Lazy mode: resolve the variable on first access and cache the value
+        # in the instance dictionary, which shadows this descriptor from then
+        # on.
+        if env.__dict__.get("_recorder") is not None:
+            raw, value = self._resolve_instrumented(env, name)
+            env._raws[name] = raw
+        else:
+            env._raws[name] = raw = self._lookup(env, env._full_prefix)
+            value = self._resolve(raw, env)
+        values[name] = value
+        return value
+
+    def _caster_for(self, _type: t.Any) -> Caster:
+        """Return the function that casts a raw value to the given type.
+
+        Casters that only depend on the types are shared by all the variables.
+        """
+        key = (_type, self.type) if self.map is None else None
         try:
-            return _type(raw)
-        except Exception as e:
-            msg = f"cannot cast {raw} to {self.type}"
-            raise TypeError(msg) from e
-
-    def _retrieve(self, env: "Env", prefix: str) -> T:
-        source = env.source
-
-        full_name = self.full_name
-        raw = source.get(full_name.format(**env.dynamic))
-        if raw is None and self.deprecations:
-            for name, deprecated_when, removed_when in self.deprecations:
-                full_deprecated_name = prefix + _normalized(name)
-                if self.private:
-                    full_deprecated_name = f"_{full_deprecated_name}"
-                raw = source.get(full_deprecated_name.format(**env.dynamic))
-                if raw is not None:
-                    deprecated_when_message = (
-                        " in version %s" % deprecated_when
-                        if deprecated_when is not None
-                        else ""
-                    )
-                    removed_when_message = (
-                        " and will be removed in version %s" % removed_when
-                        if removed_when is not None
-                        else ""
-                    )
-                    warnings.warn(
-                        "%s has been deprecated%s%s. Use %s instead"
-                        % (
-                            full_deprecated_name,
-                            deprecated_when_message,
-                            removed_when_message,
-                            full_name,
-                        ),
-                        DeprecationWarning,
-                    )
-                    break
+            cast = _CASTERS.get(key) if key is not None else None
+        except TypeError:  # Unhashable type
+            key = cast = None
+        if cast is None:
+            cast = self._build_caster(_type)
+            if key is not None:
+                _CASTERS[key] = cast
+        return cast
+
+    def _build_caster(self, _type: t.Any) -> Caster:
+        """Build the function that casts a raw value to the given type."""
+        mapper = self.map
 
-        if raw is None:
-            if not isinstance(self.default, NoDefaultType):
-                return self.default
+        if _type is bool:
 
-            raise KeyError(
-                "Mandatory environment variable {} is not set".format(full_name)
+            def cast(raw: str, env: "Env") -> t.Any:
+                return raw.lower() in env.__truthy__
+
+        elif _type is list and mapper is None:
+
+            def cast(raw: str, env: "Env") -> t.Any:
+                return raw.split(env.__item_separator__)
+
+        elif _type in (list, tuple, set, frozenset):
+            # The items are streamed into the collection.
+            if mapper is None:
+
+                def cast(raw: str, env: "Env") -> t.Any:
+                    return _type(_split(raw, env.__item_separator__))
+
+            else:
+
+                def cast(raw: str, env: "Env") -> t.Any:
+                    return _type(map(mapper, _split(raw, env.__item_separator__)))  # type: ignore[arg-type]
+
+        elif _type is array.array:
+            code = _ARRAY_CODES.get(mapper)
+            if code is None:
+                raise TypeError("array variables must have map=int or map=float")
+
+            def cast(raw: str, env: "Env") -> t.Any:
+                return array.array(
+                    code, map(mapper, _split(raw, env.__item_separator__))  # type: ignore[arg-type]
+                )
+
+        elif isinstance(_type, type) and issubclass(_type, _NumberArray):
+            item = mapper or _type._item
+
+            def cast(raw: str, env: "Env") -> t.Any:
+                return _type(map(item, _split(raw, env.__item_separator__)))  # type: ignore[arg-type]
+
+        elif _type is range:
+            declared_type = self.type
+
+            def cast(raw: str, env: "Env") -> t.Any:
+                match = _RANGE_PATTERN.fullmatch(raw)
+                if match is None:
+                    raise TypeError(f"cannot cast {raw} to {declared_type}")
+                start, end = match.groups()
+                value = range(int(start), int(end if end is not None else start) + 1)
+                if not value:
+                    raise TypeError(f"cannot cast {raw} to {declared_type}")
+                return value
+
+        elif _type is dict:
+
+            def cast(raw: str, env: "Env") -> t.Any:
+                value_separator = env.__value_separator__
+                items = (
+                    _.split(value_separator, 1)
+                    for _ in _split(raw, env.__item_separator__)
+                )
+                if mapper is None:
+                    return dict(items)
+                return dict(mapper(k, v) for k, v in items)  # type: ignore[call-arg]
+
+        else:
+            instance_of = (
+                _type.__args__  # type: ignore[union-attr]
+                if hasattr(_type, "__origin__")
+                else _type
             )
+            declared_type = self.type
+
+            def cast(raw: str, env: "Env") -> t.Any:
+                if isinstance(raw, instance_of):
+                    return raw
+
+                try:
+                    return _type(raw)
+                except Exception as e:
+                    msg = f"cannot cast {raw} to {declared_type}"
+                    raise TypeError(msg) from e
+
+        return cast
+
+    def _build_cast(self) -> Caster:
+        """Resolve the strategy to turn a raw value into the variable value."""
+        declared_type = self.type
+        instance_of = (
+            declared_type.__args__  # type: ignore[attr-defined,union-attr]
+            if hasattr(declared_type, "__origin__")
+            else declared_type
+        )
 
         if self.parser is not None:
-            parsed = self.parser(raw)
-            if not _check_type(parsed, self.type):
-                raise TypeError(
-                    "parser returned type {} instead of {}".format(
-                        type(parsed), self.type
+            parser = self.parser
+
+            def parse(raw: str, env: "Env") -> t.Any:
+                parsed = parser(raw)
+                if not isinstance(parsed, instance_of):  # type: ignore[arg-type]
+                    raise TypeError(
+                        "parser returned type {} instead of {}".format(
+                            type(parsed), declared_type
+                        )
                     )
+                return parsed
+
+            return parse
+
+        cast = self._caster_for(declared_type)
+
+        if _is_union(declared_type):
+            return self._build_union_cast(cast)
+
+        return cast
+
+    def _build_union_cast(self, cast: Caster) -> Caster:
+        """Resolve a union type to the first member that can cast a raw value.
+
+        Members are tried in declaration order. Members that cannot possibly
+        succeed are skipped without raising: ``NoneType`` never does, ``int``
+        and ``float`` are only tried if the raw value looks like a number, and
+        the value is returned as is when it is already an instance of the
+        member type, e.g. ``str``. The index of the member that succeeded is
+        cached for each raw value.
+        """
+        members: t.List[t.Tuple[t.Optional[t.Pattern], t.Optional[type], Caster]] = []
+        for ot in self.type.__args__:  # type: ignore[attr-defined,union-attr]
+            if ot is type(None):
+                continue
+            members.append(
+                (
+                    _NUMBER_PATTERNS.get(ot),
+                    ot if isinstance(ot, type) and ot not in _COLLECTIONS else None,
+                    self._caster_for(ot),
                 )
-            return parsed
+            )
 
-        if hasattr(self.type, "__origin__") and self.type.__origin__ is t.Union:  # type: ignore[attr-defined,union-attr]
-            for ot in self.type.__args__:  # type: ignore[attr-defined,union-attr]
-                try:
-                    return t.cast(T, self._cast(ot, raw, env))
-                except TypeError:
-                    pass
+        matches: t.Dict[t.Tuple[str, str, str], int] = {}
 
-        return self._cast(self.type, raw, env)
+        def resolve(raw: str, env: "Env") -> t.Any:
+            key = (raw, env.__item_separator__, env.__value_separator__)
+            i = matches.get(key)
+            if i is not None:
+                return members[i][2](raw, env)
 
-    def __call__(self, env: "Env", prefix: str) -> T:
-        value = self._retrieve(env, prefix)
+            is_str = isinstance(raw, str)
+            for i, (pattern, instance_of, member) in enumerate(members):
+                if instance_of is not None and isinstance(raw, instance_of):
+                    value: t.Any = raw
+                elif pattern is not None and is_str and pattern.fullmatch(raw) is None:
+                    continue
+                else:
+                    try:
+                        value = member(raw, env)
+                    except TypeError:
+                        continue
+
+                if len(matches) < _UNION_CACHE_SIZE:
+                    matches[key] = i
+                return value
+
+            return cast(raw, env)
+
+        return resolve
+
+    def _lookup(self, env: "Env", prefix: str) -> t.Optional[str]:
+        source = env._raw_source
+        templates = self._templates
+        dynamic = env.dynamic
+
+        full_name = templates[0](dynamic) if templates else self.full_name
+        raw = source.get(full_name)
+        if raw is None and self._deprecated:
+            for i, (name, _, _) in enumerate(self._deprecated):
+                if templates:
+                    name = templates[i + 1](dynamic)
+                raw = source.get(name)
+                if raw is not None:
+                    self._deprecated_hit(env, i, (name, full_name))
+                    break
+
+        return raw
+
+    def _lookup_named(
+        self, env: "Env"
+    ) -> t.Tuple[t.Optional[str], t.Optional[str], bool]:
+        """Like _lookup, but also return the name that provided the value, if
+        any, and whether it is a deprecated one.
 
+        _lookup is kept separate as it is on the hot path of the loaders.
+        """
+        source = env._raw_source
+        templates = self._templates
+        dynamic = env.dynamic
+
+        full_name = templates[0](dynamic) if templates else self.full_name
+        raw = source.get(full_name)
+        if raw is not None:
+            return raw, full_name, False
+
+        for i, (name, _, _) in enumerate(self._deprecated):
+            if templates:
+                name = templates[i + 1](dynamic)
+            raw = source.get(name)
+            if raw is not None:
+                self._deprecated_hit(env, i, (name, full_name))
+                return raw, name, True
+
+        return None, None, False
+
+    def _deprecated_hit(self, env: "Env", i: int, names: t.Tuple[str, str]) -> None:
+        """Count a hit of a deprecated name, and warn about it if due."""
+        hits, warned = self._deprecation_hits, self._deprecation_warned
+        if hits is None or warned is None:
+            hits = self._deprecation_hits = {}
+            warned = self._deprecation_warned = {}
+        hits[names] = hits.get(names, 0) + 1
+
+        # Warn once per pair of names, or at most once per interval if set.
+        interval = env.__deprecation_interval__
+        last = warned.get(names)
+        now = time.monotonic()
+        if last is None or interval is not None and now - last >= interval:
+            warned[names] = now
+            message = self._deprecation_messages[i]
+            if self._dynamic:
+                message = message.format(**env.dynamic)
+            warnings.warn(message, DeprecationWarning)
+
+    def deprecation_hits(self) -> t.Dict[t.Tuple[str, str], int]:
+        """Return how many times deprecated names provided the value.
+
+        The counts are keyed by the pairs of deprecated and current names.
+        """
+        return dict(self._deprecation_hits or {})
+
+    def _missing(self) -> T:
+        if not isinstance(self.default, NoDefaultType):
+            return self.default
+
+        raise KeyError(
+            "Mandatory environment variable {} is not set".format(self.full_name)
+        )
+
+    def _validate(self, value: T) -> T:
         if self.validator is not None:
             try:
                 self.validator(value)
@@ -177,11 +775,190 @@ class EnvVariable(t.Generic[T]):
 
         return value
 
+    def _build_load(self, cache: int) -> Caster:
+        """Build the function that turns a raw value into a validated value."""
+        load = self._cast
+        if self.validator is not None:
+            cast, validate = self._cast, self._validate
+
+            def validated(raw: str, env: "Env") -> t.Any:
+                return validate(cast(raw, env))
+
+            load = validated
+
+        if cache > 0:
+            return _LoadCache(load, cache)
+        return load
+
+    def cache_info(self) -> t.Optional[CacheInfo]:
+        """Return the statistics of the value cache, if enabled."""
+        return self._load.info() if isinstance(self._load, _LoadCache) else None
+
+    def cache_clear(self) -> None:
+        """Clear the value cache, if enabled."""
+        if isinstance(self._load, _LoadCache):
+            self._load.clear()
+
+    def _resolve(self, raw: t.Optional[str], env: "Env") -> T:
+        if raw is None:
+            return self._validate(self._missing())
+
+        return self._load(raw, env)
+
+    def _resolve_instrumented(
+        self, env: "Env", name: str
+    ) -> t.Tuple[t.Optional[str], T]:
+        """Resolve the variable, recording the time spent in each step.
+
+        The value cache is bypassed, so that the cast is always timed.
+        """
+        start = time.perf_counter()
+        raw, used, deprecated = self._lookup_named(env)
+        looked_up = time.perf_counter()
+
+        if raw is None:
+            origin = "default"
+            value = self._missing()
+        else:
+            origin = "deprecated" if deprecated else "source"
+            value = self._cast(raw, env)
+        cast = time.perf_counter()
+
+        value = self._validate(value)
+        end = time.perf_counter()
+
+        env._recorder.record(
+            LoadStats(
+                env._path + name,
+                used,
+                origin,
+                start,
+                looked_up - start,
+                cast - looked_up,
+                end - cast,
+                0.0,
+            )
+        )
+        return raw, value
+
+    def __call__(self, env: "Env", prefix: str) -> T:
+        return self._resolve(self._lookup(env, prefix), env)
+
+
+def _resolved(path: str) -> str:
+    """Resolve the ``parent`` steps of a dotted path."""
+    if "parent." not in path:
+        return path
+
+    parts: t.List[str] = []
+    for part in path.split("."):
+        if part == "parent" and parts and parts[-1] != "parent":
+            parts.pop()
+        else:
+            parts.append(part)
+    return ".".join(parts)
+
+
+class _Tracker:
+    """Proxy to an Env instance that records the attributes read through it.
+
+    Reads of nested and parent configurations are tracked too, and recorded as
+    dotted paths relative to the proxied instance, where ``parent`` steps up
+    one level. The methods and properties of the spec run against the proxy,
+    so that the reads they make are recorded as well.
+    """
+
+    __slots__ = ("_env", "_reads", "_path")
+
+    def __init__(self, env: "Env", reads: t.Set[str], path: str = "") -> None:
+        self._env = env
+        self._reads = reads
+        self._path = path
+
+    @property  # type: ignore[misc]
+    def __class__(self) -> t.Type["Env"]:  # type: ignore[override]
+        # Let derivations perform isinstance checks on the proxy.
+        return type(self._env)
+
+    def __getattr__(self, name: str) -> t.Any:
+        env = self._env
+        path = self._path + name
+        if name == "parent":
+            parent = env.parent
+            if parent is None:
+                return None
+            return _Tracker(parent, self._reads, path + ".")
+
+        attr = getattr(type(env), name, None)
+        if isinstance(attr, property) and attr.fget is not None:
+            return attr.fget(self)
+
+        value = getattr(env, name)
+        if (
+            isinstance(value, MethodType)
+            and value.__self__ is env
+            and value.__func__ is not getattr(Env, name, None)
+        ):
+            return MethodType(value.__func__, self)
+
+        self._reads.add(path)
+        if isinstance(value, Env):
+            return _Tracker(value, self._reads, path + ".")
+        return value
+
 
 class DerivedVariable(t.Generic[T]):
-    def __init__(self, type: t.Type[T], derivation: t.Callable[["Env"], T]) -> None:
+    __slots__ = ("type", "derivation", "lazy", "_attr")
+
+    def __init__(
+        self,
+        type: t.Type[T],
+        derivation: t.Callable[["Env"], T],
+        lazy: bool = False,
+    ) -> None:
         self.type = type
         self.derivation = derivation
+        self.lazy = lazy
+        self._attr: t.Optional[str] = None  # The attribute name on the Env class
+
+    def __set_name__(self, owner: t.Type["Env"], name: str) -> None:
+        self._attr = name
+
+    def __get__(self, env: t.Optional["Env"], owner: t.Any = None) -> t.Any:
+        # Derived items are computed on first access in lazy mode, when they
+        # are declared lazy, or after they have been invalidated. Items
+        # inherited from a base class are not part of the configuration.
+        name = t.cast(str, self._attr)
+        if env is None or type(env).__dict__.get(name) is not self:
+            return self
+
+        values = env.__dict__.get("_values")
+        if values is not None:
+            reads = env._reads
+            reads[name] = reads.get(name, 0) + 1
+            if name in values:
+                return values[name]
+        else:
+            values = env.__dict__
+
+        value = values[name] = self._derive(env, name)
+        return value
+
+    def _derive(self, env: "Env", name: str) -> T:
+        """Compute the value, recording the attributes read by the derivation."""
+        recorder = env.__dict__.get("_recorder")
+        start = time.perf_counter() if recorder is not None else 0.0
+
+        reads: t.Set[str] = set()
+        value = self(t.cast("Env", _Tracker(env, reads)))
+        env._deps[name] = frozenset(reads)
+
+        if recorder is not None:
+            derive = time.perf_counter() - start
+            recorder.record(
+                LoadStats(env._path + name, None, "derived", start, 0, 0, 0, derive)
+            )
+        return value
 
     def __call__(self, env: "Env") -> T:
         value = self.derivation(env)
@@ -194,11 +971,789 @@ class DerivedVariable(t.Generic[T]):
         return value
 
 
+def _is_config_item(value: t.Any) -> bool:
+    return isinstance(value, (EnvVariable, DerivedVariable, EnvMeta))
+
+
+def _compile_plan(env: t.Type["Env"]) -> LoadPlan:
+    """Compile the load plan of an Env subclass.
+
+    The plan is a flat view of the configuration items declared directly by
+    the class, so that instantiation does not have to scan the class
+    ``__dict__`` and dispatch on the type of each attribute every time.
+    Nested specs are recorded under their final attribute name, with any
+    pending ``__item__`` relocation tracked separately.
+    """
+    variables = []
+    nested = []
+    derived = []
+    relocations = []
+
+    for name, e in env.__dict__.items():
+        if isinstance(e, EnvVariable):
+            variables.append((name, e))
+        elif isinstance(e, type) and issubclass(e, Env):
+            if e.__item__ is not None and e.__item__ != name:
+                relocations.append((name, e.__item__))
+                name = e.__item__
+            nested.append((name, e))
+        elif isinstance(e, DerivedVariable):
+            derived.append((name, e))
+
+    return LoadPlan(tuple(variables), tuple(nested), tuple(derived), tuple(relocations))
+
+
+def _generate_loader(env: t.Type["Env"]) -> t.Callable[..., None]:
+    """Generate a straight-line loader for the items of an Env subclass.
+
+    Each variable gets its own parse call, with the default value bound as a
+    constant. Variables that are looked up by a single, static name also get a
+    direct lookup of that name. Any other variable, e.g. one with deprecations
+    or a dynamic name, goes through ``EnvVariable._lookup``.
+    """
+    plan = _plan(env)
+    ns: t.Dict[str, t.Any] = {}
+    lines = [
+        "def load(self, values, prefix, source):",
+        "    get = self._raw_source.get",
+        "    raws = self._raws",
+    ]
+
+    for i, (name, v) in enumerate(plan.variables):
+        if v.deprecations or "{" in v.full_name:
+            ns[f"_k{i}"] = v._lookup
+            lookup = f"_k{i}(self, prefix)"
+        else:
+            lookup = f"get({v.full_name!r})"
+
+        ns[f"_l{i}"] = v._load
+        if isinstance(v.default, NoDefaultType):
+            ns[f"_m{i}"] = v._missing
+            missing = f"_m{i}()"  # Raises the KeyError
+        else:
+            ns[f"_d{i}"] = v.default
+            missing = f"_d{i}"
+            if v.validator is not None:
+                ns[f"_c{i}"] = v._validate
+                missing = f"_c{i}({missing})"
+
+        lines.append(f"    raws[{name!r}] = raw = {lookup}")
+        lines.append(
+            f"    values[{name!r}] = {missing} if raw is None else _l{i}(raw, self)"
+        )
+
+    for i, (name, e) in enumerate(plan.nested):
+        ns[f"_n{i}"] = e
+        lines.append(f"    values[{name!r}] = _n{i}(source, self)")
+
+    for i, (name, d) in enumerate(plan.derived):
+        if not d.lazy:
+            ns[f"_x{i}"] = d._derive
+            lines.append(f"    values[{name!r}] = _x{i}(self, {name!r})")
+
+    exec("\n".join(lines), ns)
+
+    return ns["load"]
+
+
+def _source_keys(env: t.Type["Env"]) -> t.Tuple[str, ...]:
+    """Collect the names of all the variables in the tree of an Env subclass.
+
+    The deprecated names are included. Dynamic names are returned unformatted.
+    """
+    generation, keys = env.__source_keys__
+    if generation == _generation:
+        return keys
+
+    collected: t.List[str] = []
+    plan = _plan(env)
+    for _, v in plan.variables:
+        collected.append(v.full_name)
+        collected.extend(name for name, _, _ in v._deprecated)
+    for _, e in plan.nested:
+        collected.extend(_source_keys(e))
+
+    keys = tuple(collected)
+    env.__source_keys__ = (_generation, keys)
+
+    return keys
+
+
+def _structure(env: t.Type["Env"]) -> t.Tuple[LoadPlan, ...]:
+    """Return the load plans of the Env subclasses in the tree of one.
+
+    A plan is compiled again when the items of its class change, so the
+    structure of the tree is unchanged as long as the plans are equal.
+    """
+    plans = []
+    q = [env]
+    while q:
+        plan = _plan(q.pop())
+        plans.append(plan)
+        q.extend(e for _, e in plan.nested)
+
+    return tuple(plans)
+
+
+def _prefetch(
+    env: t.Type["Env"], source: "BatchSource", dynamics: t.Iterable[t.Dict[str, str]]
+) -> t.Mapping[str, str]:
+    """Retrieve the values of all the variables in one round trip.
+
+    The dynamic names are formatted with each of the given dynamic values.
+    """
+    keys = []
+    static = True
+    for dynamic in dynamics:
+        for key in _source_keys(env):
+            if "{" in key:
+                try:
+                    keys.append(key.format(**dynamic))
+                except KeyError:
+                    # The lookup of the variable will fail with the same error
+                    pass
+            elif static:
+                keys.append(key)
+        static = False
+
+    return source.get_many(keys)
+
+
+def _frozen(value: t.Any) -> t.Any:
+    """Return an immutable equivalent of a collection, recursively."""
+    _type = type(value)
+    if _type is list or _type is tuple:
+        return tuple(map(_frozen, value))
+    if _type is set:
+        return frozenset(value)
+    if _type is dict:
+        return MappingProxyType({k: _frozen(v) for k, v in value.items()})
+    if isinstance(value, array.array):
+        return memoryview(value).toreadonly()
+    return value
+
+
+def _thawed(value: t.Any) -> t.Any:
+    """Return a picklable equivalent of a frozen value, recursively.
+
+    Mapping proxies are copied to dicts, and read-only views to copies of the
+    arrays they were made from. Tuples and frozensets are kept.
+    """
+    _type = type(value)
+    if _type is tuple:
+        return tuple(map(_thawed, value))
+    if _type is MappingProxyType:
+        return {k: _thawed(v) for k, v in value.items()}
+    if _type is memoryview:
+        return _MUTABLE_COLLECTIONS[type(value.obj)](value.obj)
+    return value
+
+
+def _digest(data: str) -> str:
+    import hashlib
+
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+def _canonical(value: t.Any) -> str:
+    """Return a representation of a value that is the same in every process.
+
+    Unlike ``repr``, it depends neither on the iteration order of sets, which
+    varies with the hash seed, nor on the addresses of objects. Objects with
+    the default ``repr`` are represented by their type only.
+    """
+    if isinstance(value, type):
+        return "type:{}.{}".format(value.__module__, value.__qualname__)
+    if hasattr(value, "__origin__"):
+        # Typing constructs, e.g. t.Optional[int]
+        return repr(value)
+
+    _type = type(value)
+    name = "{}.{}".format(_type.__module__, _type.__qualname__)
+    if isinstance(value, (list, tuple)):
+        items = [_canonical(_) for _ in value]
+    elif isinstance(value, (set, frozenset)):
+        items = sorted(map(_canonical, value))
+    elif isinstance(value, dict):
+        items = sorted(repr((_canonical(k), _canonical(v))) for k, v in value.items())
+    elif isinstance(value, array.array):
+        items = [value.typecode, repr(value.tolist())]
+    elif _type.__repr__ is object.__repr__:
+        return name
+    else:
+        return "{}:{!r}".format(name, value)
+
+    return "{}{!r}".format(name, items)
+
+
+def _snapshot_spec(env: t.Type["Env"]) -> "_SnapshotSpec":
+    """Return what is needed to take and restore snapshots of an Env subclass.
+
+    The fingerprint is a digest of everything that determines the values of
+    the items: the paths, names, types and defaults of the variables, the
+    types of the derived items, and the parsing settings of their Env
+    subclasses, in a canonical form so that it is the same in every process.
+    Parsers, validators and derivations are not covered.
+    """
+    generation, spec = env.__snapshot_spec__
+    if generation == _generation and spec is not None:
+        return spec
+
+    parts: t.List[t.Any] = []
+    layout: t.Dict[str, t.Tuple[t.List[str], t.List[str]]] = {}
+    owners: t.Set[t.Type["Env"]] = set()
+    for entry in _index(env).entries:
+        item, owner = entry.item, entry.owner
+        prefix, _, name = entry.path.rpartition(".")
+        variables, derived = layout.setdefault(prefix + "." if prefix else "", ([], []))
+        if owner not in owners:
+            owners.add(owner)
+            parts.append(
+                (
+                    owner.__qualname__,
+                    sorted(owner.__truthy__),
+                    owner.__item_separator__,
+                    owner.__value_separator__,
+                )
+            )
+        if isinstance(item, EnvVariable):
+            variables.append(name)
+            parts.append(
+                (
+                    entry.path,
+                    item.full_name,
+                    [name for name, _, _ in item._deprecated],
+                    _canonical(item.type),
+                    _canonical(item.default),
+                    item.map is not None,
+                )
+            )
+        else:
+            derived.append(name)
+            parts.append((entry.path, _canonical(item.type)))
+
+    keys = _source_keys(env)
+    spec = _SnapshotSpec(
+        _digest(repr(parts)),
+        tuple((prefix, tuple(v), tuple(d)) for prefix, (v, d) in layout.items()),
+        tuple(key for key in keys if "{" not in key),
+        tuple(key for key in keys if "{" in key),
+    )
+    env.__snapshot_spec__ = (_generation, spec)
+
+    return spec
+
+
+def _source_fingerprint(env: "Env") -> str:
+    """Return a digest of the raw values of all the variables of the tree."""
+    spec = _snapshot_spec(env.spec)
+    source, dynamic = env._raw_source, env.dynamic
+
+    values = list(map(source.get, spec.static_keys))
+    for key in spec.dynamic_keys:
+        try:
+            values.append(source.get(key.format(**dynamic)))
+        except KeyError:
+            pass
+
+    return _digest(repr(values))
+
+
+def _trusted(info: os.stat_result) -> bool:
+    """Tell whether a file can only have been written by the current user.
+
+    The digest in the header of the snapshot files only detects corruption,
+    and unpickling a file written by someone else would run their code.
+    """
+    if not hasattr(os, "getuid"):  # Not POSIX
+        return True
+
+    import stat
+
+    return info.st_uid == os.getuid() and not info.st_mode & (
+        stat.S_IWGRP | stat.S_IWOTH
+    )
+
+
+def _read_snapshot(path: str) -> t.Optional[Snapshot]:
+    """Read a snapshot file, or return None if it is missing, corrupted or
+    untrusted.
+    """
+    try:
+        with open(path, "rb") as f:
+            if not _trusted(os.fstat(f.fileno())):
+                warnings.warn(
+                    "Ignoring the cached configuration {}: the file is not owned "
+                    "by the current user, or is writable by others".format(path),
+                    RuntimeWarning,
+                )
+                return None
+            data = f.read()
+    except OSError:
+        return None
+
+    import hashlib
+    import pickle
+
+    size = len(_SNAPSHOT_MAGIC) + 16
+    header, payload = data[:size], data[size:]
+    if header != _SNAPSHOT_MAGIC + hashlib.blake2b(payload, digest_size=16).digest():
+        return None
+
+    try:
+        snapshot = pickle.loads(payload)
+    except Exception:
+        # E.g. the values refer to classes that no longer exist.
+        return None
+
+    return snapshot if isinstance(snapshot, Snapshot) else None
+
+
+def _write_snapshot(path: str, snapshot: Snapshot) -> None:
+    """Write a snapshot file atomically.
+
+    The file is written to a temporary file in the same directory first, and
+    then renamed, so that readers never see a partial file.
+    """
+    import hashlib
+    import pickle
+    import tempfile
+
+    try:
+        payload = pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        warnings.warn("Cannot cache the configuration: {}".format(e), RuntimeWarning)
+        return
+
+    directory, name = os.path.split(os.path.abspath(path))
+    try:
+        fd, tmp = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_SNAPSHOT_MAGIC)
+                f.write(hashlib.blake2b(payload, digest_size=16).digest())
+                f.write(payload)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError as e:
+        warnings.warn("Cannot cache the configuration: {}".format(e), RuntimeWarning)
+
+
+class _SharedSequence(t.Sequence[t.Any]):
+    """A read-only sequence of numbers or strings in shared memory.
+
+    Strings are decoded on access.
+    """
+
+    __slots__ = ("_memory", "_items", "_offsets", "_strings")
+
+    def __init__(self, memory: t.Any, shared: _SharedArray) -> None:
+        # Keep the segment open for as long as the view exists.
+        self._memory = memory
+        buf = memory.buf
+        start = shared.offset
+        if shared.code == "s":
+            self._items = None
+            end = start + 8 * (shared.length + 1)
+            self._offsets = buf[start:end].cast("q")
+            self._strings = buf[shared.data : shared.data + self._offsets[-1]]  # noqa
+        else:
+            end = start + 8 * shared.length
+            self._items = buf[start:end].cast(shared.code)
+
+    def __len__(self) -> int:
+        if self._items is not None:
+            return len(self._items)
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: t.Any) -> t.Any:
+        if isinstance(i, slice):
+            return [self[_] for _ in range(*i.indices(len(self)))]
+        if self._items is not None:
+            return self._items[i]
+
+        if i < 0:
+            i += len(self)
+            if i < 0:
+                raise IndexError("index out of range")
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return str(self._strings[start:end], "utf-8", "surrogatepass")
+
+    def __iter__(self) -> t.Iterator[t.Any]:
+        if self._items is not None:
+            return iter(self._items)
+        strings = self._strings
+        return (
+            str(strings[start:end], "utf-8", "surrogatepass")
+            for start, end in zip(self._offsets, self._offsets[1:])
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, tuple, _SharedSequence)):
+            return len(self) == len(other) and all(map(eq, self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return "{}({!r})".format(type(self).__name__, list(self))
+
+    def __reduce__(self) -> t.Tuple[t.Any, ...]:
+        return list, (list(self),)
+
+
+class _SharedTuple(_SharedSequence):
+    """A shared sequence published from a tuple, and hashable like one."""
+
+    __slots__ = ()
+
+    def __hash__(self) -> int:
+        return hash(tuple(self))
+
+    def __reduce__(self) -> t.Tuple[t.Any, ...]:
+        return tuple, (tuple(self),)
+
+
+class _SharedSet(t.AbstractSet[t.Any]):
+    """A read-only set of numbers or strings in shared memory.
+
+    The items are sorted, and looked up by bisection.
+    """
+
+    __slots__ = ("_items", "_keys")
+
+    def __init__(self, items: _SharedSequence) -> None:
+        self._items = items
+        # Numbers are bisected over the memory view directly.
+        self._keys = items._items if items._items is not None else items
+
+    @classmethod
+    def _from_iterable(cls, it: t.Iterable[t.Any]) -> t.FrozenSet[t.Any]:
+        return frozenset(it)
+
+    def __contains__(self, value: object) -> bool:
+        keys = self._keys
+        try:
+            i = bisect_left(keys, value)
+        except TypeError:
+            return False
+        return i < len(keys) and keys[i] == value
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> t.Iterator[t.Any]:
+        return iter(self._items)
+
+    def __repr__(self) -> str:
+        return "{}({!r})".format(type(self).__name__, set(self))
+
+    def __reduce__(self) -> t.Tuple[t.Any, ...]:
+        return frozenset, (list(self),)
+
+
+class _SharedFrozenSet(_SharedSet):
+    """A shared set published from a frozenset, and hashable like one."""
+
+    __slots__ = ()
+
+    def __hash__(self) -> int:
+        return hash(frozenset(self))
+
+
+class _SharedMapping(t.Mapping[str, t.Any]):
+    """A read-only mapping from strings to numbers or strings in shared memory.
+
+    The keys are sorted, and looked up by bisection.
+    """
+
+    __slots__ = ("_keys", "_values")
+
+    def __init__(self, keys: _SharedSequence, values: _SharedSequence) -> None:
+        self._keys = keys
+        self._values = values
+
+    def __getitem__(self, key: str) -> t.Any:
+        keys = self._keys
+        try:
+            i = bisect_left(keys, key)
+        except TypeError:
+            raise KeyError(key) from None
+        if i < len(keys) and keys[i] == key:
+            return self._values[i]
+        raise KeyError(key)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self) -> t.Iterator[str]:
+        return iter(self._keys)
+
+    def __repr__(self) -> str:
+        return "{}({!r})".format(type(self).__name__, dict(self.items()))
+
+    def __reduce__(self) -> t.Tuple[t.Any, ...]:
+        return dict, (dict(zip(self._keys, self._values)),)
+
+
+def _shared_code(items: t.List[t.Any]) -> t.Optional[str]:
+    """Return the code of the shared array that can hold the items, if any."""
+    types = set(map(type, items))
+    if types == {str}:
+        return "s"
+    if types == {int} and -(2**63) <= min(items) and max(items) < 2**63:
+        return "q"
+    if types == {float}:
+        return "d"
+    return None
+
+
+def _write_shared_array(
+    data: bytearray, code: str, items: t.List[t.Any]
+) -> _SharedArray:
+    # Align the arrays on 8 bytes.
+    data += bytes(-len(data) % 8)
+    offset = len(data)
+    if code != "s":
+        data += array.array(code, items).tobytes()
+        return _SharedArray(code, offset, len(items), None)
+
+    encoded = [_.encode("utf-8", "surrogatepass") for _ in items]
+    data += array.array("q", accumulate(map(len, encoded), initial=0)).tobytes()
+    strings = len(data)
+    data += b"".join(encoded)
+    return _SharedArray(code, offset, len(items), strings)
+
+
+def _share(value: t.Any, data: bytearray, min_items: int) -> t.Any:
+    """Write a collection to the data of a shared memory segment.
+
+    Return the placeholder of the collection, or the value itself if it is too
+    small, or cannot be shared.
+    """
+    kind = _SHARED_KINDS.get(type(value))
+    if kind is None or len(value) < max(min_items, 1):
+        return value
+
+    if kind == "mapping":
+        keys = sorted(value) if _shared_code(list(value)) == "s" else None
+        values = [value[_] for _ in keys] if keys is not None else []
+        code = _shared_code(values)
+        if keys is None or code is None:
+            return value
+        return _SharedValue(
+            kind,
+            _write_shared_array(data, "s", keys),
+            _write_shared_array(data, code, values),
+        )
+
+    items = list(value)
+    code = _shared_code(items)
+    if code is None:
+        return value
+    if kind in ("set", "frozenset"):
+        items.sort()
+    return _SharedValue(kind, _write_shared_array(data, code, items), None)
+
+
+def _shared_view(memory: t.Any, value: _SharedValue) -> t.Any:
+    if value.kind == "tuple":
+        return _SharedTuple(memory, value.items)
+    items = _SharedSequence(memory, value.items)
+    if value.kind == "set":
+        return _SharedSet(items)
+    if value.kind == "frozenset":
+        return _SharedFrozenSet(items)
+    if value.kind == "mapping":
+        return _SharedMapping(items, _SharedSequence(memory, value.values))
+    return items
+
+
+# The class of the attached shared memory segments, created on first use.
+_AttachedMemory: t.Optional[t.Type[t.Any]] = None
+
+# The process that started its own resource tracker to attach segments.
+_tracker_pid: t.Optional[int] = None
+
+
+def _attach_shared_memory(name: str) -> t.Any:
+    global _AttachedMemory, _tracker_pid
+
+    if _AttachedMemory is None:
+        from multiprocessing import shared_memory
+
+        class AttachedMemory(shared_memory.SharedMemory):
+            def __del__(self) -> None:
+                # The views over the segment can be collected after it when
+                # they are part of the same reference cycle, e.g. that of an
+                # Env and its nested instances. The mapping is then released
+                # along with the last of them.
+                try:
+                    self.close()
+                except (BufferError, OSError):
+                    pass
+
+        _AttachedMemory = AttachedMemory
+
+    try:
+        # The segment is owned by the publisher, and must not be removed when
+        # this process exits.
+        return _AttachedMemory(name, track=False)  # type: ignore[call-arg]
+    except TypeError:
+        pass
+
+    # Python < 3.13 cannot opt out, and registers the segment with the resource
+    # tracker of this process, which would remove it on exit. Processes started
+    # by the publisher share its tracker, which must keep the registration.
+    if os.name != "posix":
+        return _AttachedMemory(name)
+
+    from multiprocessing import resource_tracker  # type: ignore[attr-defined]
+
+    if resource_tracker._resource_tracker._fd is None:
+        _tracker_pid = os.getpid()
+
+    memory: t.Any = _AttachedMemory(name)
+    if _tracker_pid == os.getpid():
+        resource_tracker.unregister(memory._name, "shared_memory")
+    return memory
+
+
+def _name_pattern(template: str) -> t.Pattern:
+    """Compile a dynamic name into a pattern matching any of its values."""
+    pattern = "".join(
+        re.escape(literal) + ("" if field is None else ".+?")
+        for literal, field, _, _ in string.Formatter().parse(template)
+    )
+    return re.compile(pattern)
+
+
+class _NameTrie:
+    """Prefix trie of names, for nearest matches by edit distance.
+
+    The rows of the edit distance matrix are computed once per trie node, and
+    thus shared by all the names with a common prefix. Branches are pruned as
+    soon as no name below them can be within the maximum distance.
+    """
+
+    def __init__(self, names: t.Iterable[str]) -> None:
+        self.root: t.Dict[t.Optional[str], t.Any] = {}
+        for name in names:
+            node = self.root
+            for c in name:
+                node = node.setdefault(c, {})
+            node[None] = name
+
+    def search(self, name: str, max_distance: int) -> t.List[t.Tuple[int, str]]:
+        """Return the names within the given distance, closest first."""
+        found = []
+        first = list(range(len(name) + 1))
+        stack = [(c, child, first) for c, child in self.root.items() if c is not None]
+        while stack:
+            c, node, previous = stack.pop()
+            d = previous[0] + 1
+            row = [d]
+            for n, diagonal, above in zip(name, previous, previous[1:]):
+                d = min(d + 1, above + 1, diagonal + (n != c))
+                row.append(d)
+
+            if row[-1] <= max_distance and None in node:
+                found.append((row[-1], node[None]))
+            if min(row) <= max_distance:
+                stack.extend((k, v, row) for k, v in node.items() if k is not None)
+
+        return sorted(found)
+
+
+def _names_trie(env: t.Type["Env"]) -> _NameTrie:
+    generation, trie = env.__names_trie__
+    if generation == _generation and trie is not None:
+        return trie
+
+    trie = _NameTrie(_index(env).by_name)
+    env.__names_trie__ = (_generation, trie)
+
+    return trie
+
+
+def _plan(env: t.Type["Env"]) -> LoadPlan:
+    plan = env.__plan__
+    if plan is None:
+        plan = env.__plan__ = _compile_plan(env)
+    return plan
+
+
+def _index(env: t.Type["Env"]) -> "SpecIndex":
+    """Return the flattened index of the items in the tree of an Env subclass.
+
+    The index is built with a breadth-first traversal of the tree, and cached
+    until the structure of any Env subclass changes.
+    """
+    generation, index, _ = env.__index__
+    if generation == _generation and index is not None:
+        return index
+
+    entries = []
+    q: t.Deque[t.Tuple[str, t.Type["Env"]]] = deque([("", env)])
+    while q:
+        path, e = q.popleft()
+        for k, v in e.__dict__.items():
+            if isinstance(v, (EnvVariable, DerivedVariable)):
+                entries.append(IndexEntry(path + k, v, e))
+            elif isinstance(v, type) and issubclass(v, Env):
+                q.append((f"{path}{v.__item__ or k}.", v))
+
+    # Map every environment name to its declaration. Primary names take
+    # precedence over deprecated ones. Dynamic names are matched by pattern.
+    by_name: t.Dict[str, IndexEntry] = {}
+    dynamic = []
+    variables = [_ for _ in entries if isinstance(_.item, EnvVariable)]
+    for entry in variables:
+        for name, _, _ in entry.item._deprecated:
+            by_name.setdefault(name, entry)
+    for entry in variables:
+        by_name[entry.item.full_name] = entry
+    for name, entry in list(by_name.items()):
+        if "{" in name:
+            del by_name[name]
+            dynamic.append((_name_pattern(name), entry))
+
+    index = SpecIndex(
+        tuple(entries), {_.path: _ for _ in entries}, by_name, tuple(dynamic)
+    )
+
+    # The views returned by Env.items, keyed by (recursive, include_derived).
+    # They share the same (path, item) pairs.
+    pairs = [(_.path, _.item) for _ in entries]
+    views = {
+        (recursive, derived): tuple(
+            pair
+            for pair, _ in zip(pairs, entries)
+            if (recursive or _.owner is env)
+            and (derived or isinstance(_.item, EnvVariable))
+        )
+        for recursive in (False, True)
+        for derived in (False, True)
+    }
+
+    env.__index__ = (_generation, index, views)
+
+    return index
+
+
 class EnvMeta(type):
     def __new__(
         cls, name: str, bases: t.Tuple[t.Type], ns: t.Dict[str, t.Any]
     ) -> t.Any:
-        env = t.cast("Env", super().__new__(cls, name, bases, ns))
+        env = t.cast(t.Type["Env"], super().__new__(cls, name, bases, ns))
+
+        env.__plan__ = _compile_plan(env)
+        env.__index__ = (-1, None, None)
+        env.__loader__ = (-1, None)
+        env.__source_keys__ = (-1, ())
+        env.__names_trie__ = (-1, None)
+        env.__instances__ = _InstanceCache()
+        env.__snapshot_spec__ = (-1, None)
 
         prefix = ns.get("__prefix__")
         if prefix:
@@ -208,6 +1763,42 @@ class EnvMeta(type):
 
         return env
 
+    def __setattr__(cls, name: str, value: t.Any) -> None:
+        # Keep the load plan in sync with changes to the configuration items,
+        # e.g. those made by Env.include.
+        stale = _is_config_item(value) or _is_config_item(cls.__dict__.get(name))
+        super().__setattr__(name, value)
+        if isinstance(value, (EnvVariable, DerivedVariable)):
+            value.__set_name__(t.cast(t.Type[Env], cls), name)
+        if stale:
+            # The plan is compiled again on next use, so that changes made in
+            # bulk, e.g. by Env.include, do not recompile it for each item.
+            super().__setattr__("__plan__", None)
+            _invalidate()
+
+    def __delattr__(cls, name: str) -> None:
+        stale = _is_config_item(cls.__dict__.get(name))
+        super().__delattr__(name)
+        if stale:
+            super().__setattr__("__plan__", None)
+            _invalidate()
+
+
+class BatchSource(t.Protocol):
+    """A source of raw values that can retrieve many keys in one round trip.
+
+    When an Env is created from a source that implements ``get_many``, the
+    names of all the variables in the tree, including deprecated ones, are
+    requested with a single call. Keys that are not set should be omitted from
+    the returned mapping.
+    """
+
+    def get(self, key: str, default: t.Optional[str] = None) -> t.Optional[str]:
+        ...
+
+    def get_many(self, keys: t.Iterable[str]) -> t.Mapping[str, str]:
+        ...
+
 
 class Env(metaclass=EnvMeta):
     """Env base class.
@@ -237,6 +1828,43 @@ class Env(metaclass=EnvMeta):
     respectively. All the elements in the collections, including key and values
     for dictionaries, will be of type string. For more advanced control over
     the final type, a custom ``parser`` can be passed instead.
+
+    Variables can memoize their parsed and validated values across instances
+    by passing ``cache=<maxsize>`` to their declaration. This should only be
+    used with pure parsers and validators. The statistics of the cache are
+    available from the ``cache_info`` method of the variable.
+
+    On first instantiation, a specialized loader is generated for each subclass
+    that retrieves all its items in straight-line code. The generic loading
+    loop can be used instead by setting the ``__codegen__`` class attribute to
+    ``False``.
+
+    Variables are normally retrieved, parsed and validated when the instance is
+    created. In lazy mode, which is enabled by setting the ``__lazy__`` class
+    attribute to ``True`` or by passing ``lazy=True`` to the constructor, each
+    variable and derived item is instead resolved on first access and cached
+    on the instance. Errors, such as a missing mandatory variable, are then
+    raised on access too. Nested configurations inherit the mode of their
+    parent.
+
+    The attributes read by each derivation are recorded when the derived item
+    is computed. Overriding a variable, either by assigning it or through
+    ``reload``, invalidates only the derived items that depend on it, which
+    are recomputed on their next access. Expensive derived items can also be
+    declared with ``lazy=True`` to be computed only when first accessed.
+
+    To record the reads, derivations are passed a proxy to the instance rather
+    than the instance itself. ``isinstance`` checks work on the proxy, but
+    ``type`` returns the proxy class. A proxy kept by the derivation, e.g. in
+    a closure, still reads the current values of the instance, but the derived
+    item does not depend on what is read through it after the derivation has
+    returned.
+
+    A variable set through a deprecated name triggers a ``DeprecationWarning``
+    only the first time, for each pair of deprecated and current names. Set
+    ``__deprecation_interval__`` to a number of seconds to warn again at most
+    once per interval instead, e.g. 0 to warn every time. The hits are counted
+    regardless, and reported by ``deprecation_hits``.
     """
 
     __truthy__ = frozenset({"1", "true", "yes", "on"})
@@ -244,44 +1872,855 @@ class Env(metaclass=EnvMeta):
     __item__: t.Optional[str] = None
     __item_separator__ = ","
     __value_separator__ = ":"
+    __lazy__ = False
+    __codegen__ = True
+    __deprecation_interval__: t.Optional[float] = None
+    __instances_size__ = 128
+    __instances_ttl__: t.Optional[float] = None
+    __instrumented__ = False
+    __track_reads__ = False
+    __load_hook__: t.Optional[t.Callable[[LoadStats], None]] = None
+    __plan__: t.Optional[LoadPlan]
+    __index__: t.Tuple[
+        int,
+        t.Optional[SpecIndex],
+        t.Optional[t.Dict[t.Tuple[bool, bool], t.Tuple[t.Tuple[str, t.Any], ...]]],
+    ]
+    __loader__: t.Tuple[int, t.Optional[t.Callable[..., None]]]
+    __source_keys__: t.Tuple[int, t.Tuple[str, ...]]
+    __names_trie__: t.Tuple[int, t.Optional[_NameTrie]]
+    __instances__: _InstanceCache
+    __snapshot_spec__: t.Tuple[int, t.Optional[_SnapshotSpec]]
+
+    # Instance attributes. They are written to the instance dictionary directly
+    # by __init__, and some of them are only set in certain modes.
+    source: t.Union[t.Mapping[str, str], BatchSource]
+    parent: t.Optional["Env"]
+    dynamic: t.Dict[str, str]
+    spec: t.Type["Env"]
+    _raws: t.Dict[str, t.Optional[str]]
+    _deps: t.Dict[str, t.FrozenSet[str]]
+    _lazy: bool
+    _full_prefix: str
+    _raw_source: t.Mapping[str, str]
+    _values: t.Dict[str, t.Any]  # With read tracking
+    _reads: t.Dict[str, int]  # With read tracking
+    _recorder: _LoadRecorder  # When instrumented
+    _path: str  # When instrumented
+    _frozen: bool  # Once frozen
 
     def __init__(
         self,
-        source: t.Optional[t.Dict[str, str]] = None,
+        source: t.Optional[t.Union[t.Dict[str, str], BatchSource]] = None,
         parent: t.Optional["Env"] = None,
         dynamic: t.Optional[t.Dict[str, str]] = None,
+        lazy: t.Optional[bool] = None,
     ) -> None:
-        self.source = source or os.environ
-        self.parent = parent
-        self.dynamic = (
+        # The instance dictionary is written to directly, bypassing the
+        # override tracking in __setattr__.
+        values = self.__dict__
+
+        values["source"] = source or os.environ
+        values["parent"] = parent
+        values["dynamic"] = (
             {k.upper(): v.upper() for k, v in dynamic.items()}
             if dynamic is not None
             else {}
         )
+        values["_raws"] = {}
+        values["_deps"] = {}
+
+        # With read tracking, the values of the items are stored separately.
+        store = values
+        if self.__track_reads__ or (
+            parent is not None and "_values" in parent.__dict__
+        ):
+            store = values["_values"] = {}
+            values["_reads"] = {}
+        values["_lazy"] = (
+            lazy
+            if lazy is not None
+            else self.__lazy__ or (parent is not None and parent._lazy)
+        )
+
+        full_prefix = (parent._full_prefix if parent is not None else "") + _normalized(
+            self.__prefix__
+        )
+        if full_prefix and not full_prefix.endswith("_"):
+            full_prefix += "_"
+        values["_full_prefix"] = full_prefix
+
+        values["spec"] = self.__class__
+        plan = _plan(self.spec)
+        if plan.relocations:
+            # Move the subclasses to their __item__ attribute
+            for name, item in plan.relocations:
+                e = self.spec.__dict__[name]
+                setattr(self.spec, item, e)
+                delattr(self.spec, name)
+            plan = _plan(self.spec)
+
+        # Nested configurations report to the recorder of their parent.
+        if parent is not None and "_recorder" in parent.__dict__:
+            item = next(n for n, e in _plan(parent.spec).nested if e is self.spec)
+            values["_recorder"] = parent._recorder
+            values["_path"] = f"{parent._path}{item}."
+        elif self.__instrumented__ or self.__load_hook__ is not None:
+            values["_recorder"] = _LoadRecorder(type(self).__load_hook__)
+            values["_path"] = ""
+
+        if parent is not None and parent.source is self.source:
+            values["_raw_source"] = parent._raw_source
+        elif "_raw_source" in values:
+            # The values have been retrieved ahead of time, see _preloaded.
+            pass
+        elif hasattr(self.source, "get_many"):
+            values["_raw_source"] = self._prefetch()
+        else:
+            values["_raw_source"] = self.source
+
+        if self._lazy:
+            # Only the nested configurations are created upfront. Variables
+            # and derived items are resolved on access by their descriptors.
+            for name, e in plan.nested:
+                values[name] = e(source, self)
+            return
+
+        prefix = self._full_prefix
+        if "_recorder" in values:
+            raws = self._raws
+            for name, v in plan.variables:
+                raws[name], store[name] = v._resolve_instrumented(self, name)
+            for name, e in plan.nested:
+                values[name] = e(source, self)
+            for name, d in plan.derived:
+                if not d.lazy:
+                    store[name] = d._derive(self, name)
+            return
+
+        if self.__codegen__ and store is values:
+            generation, loader = self.__loader__
+            if generation != _generation or loader is None:
+                loader = _generate_loader(self.spec)
+                self.spec.__loader__ = (_generation, loader)
+            loader(self, values, prefix, source)
+            return
+
+        raws = self._raws
+        for name, v in plan.variables:
+            raws[name] = raw = v._lookup(self, prefix)
+            store[name] = v._resolve(raw, self)
+
+        for name, e in plan.nested:
+            values[name] = e(source, self)
+
+        for name, d in plan.derived:
+            if not d.lazy:
+                store[name] = d._derive(self, name)
+
+    def __setattr__(self, name: str, value: t.Any) -> None:
+        if "_frozen" in self.__dict__:
+            raise AttributeError(
+                "Cannot set {}: the configuration is frozen".format(name)
+            )
+
+        values = self.__dict__.get("_values")
+        if values is not None and isinstance(
+            self.spec.__dict__.get(name), (EnvVariable, DerivedVariable)
+        ):
+            values[name] = value
+        else:
+            super().__setattr__(name, value)
+
+        # Overriding a variable or a derived item invalidates the derived items
+        # that depend on it. An overridden derived item is never recomputed.
+        if name in self.__dict__.get("_raws", ()) or name in self.__dict__.get(
+            "_deps", ()
+        ):
+            self._deps.pop(name, None)
+            root, path = self._root()
+            root._invalidate({path + name})
+
+    def _root(self) -> t.Tuple["Env", str]:
+        """Return the root of the instance tree and the path prefix to self."""
+        env, path = self, ""
+        while env.parent is not None:
+            parent = env.parent
+            for name, _ in _plan(parent.spec).nested:
+                if parent.__dict__.get(name) is env:
+                    path = f"{name}.{path}"
+                    break
+            else:
+                break
+            env = parent
+
+        return env, path
+
+    def _invalidate(self, changed: t.Set[str]) -> t.List[str]:
+        """Invalidate the derived items that depend on the changed paths.
+
+        The paths are relative to this instance, which should be the root of
+        the tree. Invalidated items are recomputed on their next access, and
+        their own dependents are invalidated in turn. Returns the paths of the
+        invalidated items, bottom-up.
+        """
+        # Derived items that have been computed, with their dependencies.
+        derived = [
+            (path + name, env, name, {_resolved(path + dep) for dep in deps})
+            for path, env in reversed(list(self._tree()))
+            for name, deps in env._deps.items()
+            if name in env._store()
+        ]
+        order = {path: i for i, (path, *_) in enumerate(derived)}
+
+        invalidated: t.List[str] = []
+        while derived:
+            remaining = []
+            for item in derived:
+                path, env, name, deps = item
+                if deps & changed:
+                    del env._store()[name]
+                    changed.add(path)
+                    invalidated.append(path)
+                else:
+                    remaining.append(item)
+            if len(remaining) == len(derived):
+                break
+            derived = remaining
+
+        invalidated.sort(key=order.__getitem__)
+        return invalidated
+
+    def _store(self) -> t.Dict[str, t.Any]:
+        """Return the dictionary that holds the values of the items."""
+        return self.__dict__.get("_values", self.__dict__)
+
+    def _tree(self, path: str = "") -> t.Iterator[t.Tuple[str, "Env"]]:
+        """Walk the instance tree, yielding each Env with its path prefix."""
+        yield path, self
+        for name, _ in _plan(self.spec).nested:
+            nested = self.__dict__.get(name)
+            if isinstance(nested, Env):
+                yield from nested._tree(f"{path}{name}.")
+
+    def _changed_raws(
+        self,
+    ) -> t.Iterator[t.Tuple[str, EnvVariable, t.Optional[str]]]:
+        """Yield the loaded variables whose raw value differs from the last one."""
+        raws = self._raws
+        prefix = self._full_prefix
+        for name, v in _plan(self.spec).variables:
+            if name in raws:
+                raw = v._lookup(self, prefix)
+                if raw != raws[name]:
+                    yield name, v, raw
+
+    def reload(
+        self, source: t.Optional[t.Union[t.Dict[str, str], BatchSource]] = None
+    ) -> t.List[str]:
+        """Reload the configuration from the source.
+
+        Only the variables whose raw value has changed since they were last
+        retrieved are parsed and validated again. The derived items that
+        depend on them are invalidated, and recomputed on their next access.
+        If a new source is given, it replaces the current one.
+
+        Returns the paths of the variables whose value has changed, followed
+        by those of the invalidated derived items. If any of the new values is
+        invalid, the exception is raised and the configuration is left
+        untouched.
+        """
+        if "_frozen" in self.__dict__:
+            raise RuntimeError("Cannot reload a frozen configuration")
+
+        envs = list(self._tree())
+        previous = [(env.source, env._raw_source) for _, env in envs]
+
+        try:
+            if source is not None:
+                for _, env in envs:
+                    env.source = source
+            raw_source = (
+                self._prefetch() if hasattr(self.source, "get_many") else self.source
+            )
+            for _, env in envs:
+                env._raw_source = raw_source  # type: ignore[assignment]
+
+            updates = [
+                (path, env, name, raw, v._resolve(raw, env))
+                for path, env in envs
+                for name, v, raw in env._changed_raws()
+            ]
+        except Exception:
+            for (_, env), (s, r) in zip(envs, previous):
+                env.source, env._raw_source = s, r
+            raise
+
+        changed = []
+        for path, env, name, raw, value in updates:
+            env._raws[name] = raw
+            values = env._store()
+            if values.get(name) != value:
+                changed.append(path + name)
+            values[name] = value
+
+        return changed + self._invalidate(set(changed))
+
+    @classmethod
+    def load_for(
+        cls,
+        dynamics: t.Iterable[t.Dict[str, str]],
+        source: t.Optional[t.Union[t.Dict[str, str], BatchSource]] = None,
+    ) -> t.List["Env"]:
+        """Create one instance of the configuration for each dynamic context.
+
+        This is equivalent to ``[cls(source, dynamic=d) for d in dynamics]``,
+        but only the variables with a dynamic name are retrieved for each
+        context. The other values, and the nested configurations, are loaded
+        once and shared by all the instances. Mutable collections are copied.
+        With a batch source, the values for all the contexts are retrieved in
+        a single round trip. Instrumented configurations are loaded in full for
+        each context, so that every instance records its own statistics.
+        """
+        contexts = [
+            {k.upper(): v.upper() for k, v in dynamic.items()} for dynamic in dynamics
+        ]
+        if not contexts:
+            return []
+
+        if cls.__lazy__ or cls.__track_reads__:
+            # Nothing is loaded upfront, so there is nothing to share, or the
+            # reads are tracked per instance.
+            return [cls(source, dynamic=dynamic) for dynamic in contexts]
+
+        source = source or t.cast(t.Dict[str, str], os.environ)
+        raw_source: t.Optional[t.Mapping[str, str]] = None
+        if hasattr(source, "get_many"):
+            batch = t.cast(BatchSource, source)
+            raw_source = _prefetch(cls, batch, contexts)
+            first = cls._preloaded(batch, raw_source, contexts[0])
+        else:
+            first = cls(source, dynamic=contexts[0])
+
+        if any("_recorder" in e.__dict__ for _, e in first._tree()):
+            # Each instance records the statistics of its own load.
+            return [first] + [
+                cls._preloaded(batch, raw_source, dynamic)
+                if raw_source is not None
+                else cls(source, dynamic=dynamic)
+                for dynamic in contexts[1:]
+            ]
+
+        dynamic_variables = [
+            (name, v) for name, v in _plan(cls).variables if v._dynamic
+        ]
+        envs = [first]
+        mutable: t.Dict[int, t.List[t.Tuple[str, t.Any]]] = {}
+        for dynamic in contexts[1:]:
+            env = first._clone(None, dynamic, mutable)
+            raws, values = env._raws, env.__dict__
+
+            # The derivations that read the dynamic values themselves depend
+            # on the context too.
+            changed = {"dynamic"}
+            for name, v in dynamic_variables:
+                raw = v._lookup(env, env._full_prefix)
+                if raw != raws[name]:
+                    raws[name] = raw
+                    values[name] = v._resolve(raw, env)
+                    changed.add(name)
+
+            # Derived items that depend on the dynamic variables are computed
+            # again, unless they are lazy.
+            for path in env._invalidate(changed):
+                *names, name = path.split(".")
+                owner = env
+                for n in names:
+                    owner = getattr(owner, n)
+                if not getattr(owner.spec, name).lazy:
+                    getattr(owner, name)
+            envs.append(env)
+
+        return envs
+
+    @classmethod
+    def _preloaded(
+        cls,
+        source: BatchSource,
+        raw_source: t.Mapping[str, str],
+        dynamic: t.Dict[str, str],
+    ) -> "Env":
+        """Create an instance from values already retrieved from the source."""
+        env = cls.__new__(cls)
+        env.__dict__["_raw_source"] = raw_source
+        env.__init__(source, dynamic=dynamic)  # type: ignore[misc]
+        return env
+
+    @classmethod
+    def cached(
+        cls,
+        source: t.Optional[t.Union[t.Dict[str, str], BatchSource]] = None,
+        dynamic: t.Optional[t.Dict[str, str]] = None,
+    ) -> "Env":
+        """Return a cached instance of the configuration.
+
+        Instances are cached by dynamic values and raw values of all the
+        variables in the source, so that sources with the same values share
+        them, and a change in the source, or in the items of the Env subclass
+        or of its nested ones, loads a new instance. The least recently used
+        instances are evicted once there are more than ``__instances_size__``,
+        and, if ``__instances_ttl__`` is set, instances older than that many
+        seconds are loaded again. Batch sources are only queried once per call.
+        The method is thread-safe.
+
+        The cached instances are shared by all the callers, and should not be
+        modified.
+        """
+        source = source or t.cast(t.Dict[str, str], os.environ)
+        context = {k.upper(): v.upper() for k, v in dynamic.items()} if dynamic else {}
+        items = tuple(sorted(context.items()))
+        keys = _source_keys(cls)
+        size = max(cls.__instances_size__, 0)
+        cache = cls.__instances__
+
+        # The names of the variables, formatted with the dynamic values.
+        with cache.lock:
+            formatted = cache.names.get(items)
+        if formatted is not None and formatted[0] == keys:
+            names = formatted[1]
+        else:
+            names = []
+            for name in keys:
+                try:
+                    names.append(name.format(**context) if "{" in name else name)
+                except KeyError:
+                    # The lookup of the variable will fail with the same error
+                    pass
+            with cache.lock:
+                cache.names[items] = (keys, names)
+                cache.names.move_to_end(items)
+                while len(cache.names) > size:
+                    cache.names.popitem(last=False)
+
+        raw_source: t.Optional[t.Mapping[str, str]] = None
+        if hasattr(source, "get_many"):
+            raw_source = t.cast(BatchSource, source).get_many(names)
+            fingerprint = tuple(map(raw_source.get, names))
+        else:
+            fingerprint = tuple(map(source.get, names))
+
+        # Hashing the raw values once is cheaper than hashing them with the
+        # key on every access.
+        key = (items, hash(fingerprint))
+        now = time.monotonic()
+        with cache.lock:
+            entry = cache.entries.get(key)
+            if (
+                entry is not None
+                and entry.fingerprint == fingerprint
+                and entry.structure == _structure(cls)
+                and (entry.expires is None or now < entry.expires)
+            ):
+                cache.hits += 1
+                cache.entries.move_to_end(key)
+                return entry.env
+
+        if raw_source is not None:
+            env = cls._preloaded(t.cast(BatchSource, source), raw_source, context)
+        else:
+            env = cls(source, dynamic=context)
+
+        ttl = cls.__instances_ttl__
+        entry = _CachedInstance(
+            _structure(cls), fingerprint, env, now + ttl if ttl is not None else None
+        )
+        with cache.lock:
+            cache.misses += 1
+            cache.entries[key] = entry
+            cache.entries.move_to_end(key)
+            while len(cache.entries) > size:
+                cache.entries.popitem(last=False)
+
+        return env
+
+    @classmethod
+    def cached_info(cls) -> CacheInfo:
+        """Return the statistics of the instance cache used by ``cached``."""
+        cache = cls.__instances__
+        with cache.lock:
+            return CacheInfo(
+                cache.hits, cache.misses, cls.__instances_size__, len(cache.entries)
+            )
+
+    @classmethod
+    def cached_clear(cls) -> None:
+        """Clear the instance cache used by ``cached``, and its statistics."""
+        cache = cls.__instances__
+        with cache.lock:
+            cache.entries.clear()
+            cache.names.clear()
+            cache.hits = cache.misses = 0
+
+    def _clone(
+        self,
+        parent: t.Optional["Env"],
+        dynamic: t.Dict[str, str],
+        mutable: t.Dict[int, t.List[t.Tuple[str, t.Any]]],
+    ) -> "Env":
+        """Copy the instance tree, sharing the immutable values.
+
+        The names of the mutable values of each instance of the tree, with the
+        functions that copy them, are collected in ``mutable`` on the first
+        copy, and reused afterwards.
+        """
+        copiers = mutable.get(id(self))
+        if copiers is None:
+            copiers = mutable[id(self)] = []
+            for name, value in self.__dict__.items():
+                if name in self._raws or name in self._deps:
+                    copier = _copier(value)
+                    if copier is not None:
+                        copiers.append((name, copier))
+
+        env = object.__new__(self.__class__)
+        values = env.__dict__
+        values.update(self.__dict__)
+        for name, copy in copiers:
+            values[name] = copy(values[name])
+        values["parent"] = parent
+        values["dynamic"] = dynamic
+        values["_raws"] = dict(self._raws)
+        values["_deps"] = dict(self._deps)
+
+        # Nested configurations do not inherit the dynamic values.
+        for name, _ in _plan(self.spec).nested:
+            values[name] = self.__dict__[name]._clone(env, {}, mutable)
+
+        return env
+
+    def snapshot(self) -> Snapshot:
+        """Export the resolved values of the configuration.
+
+        The snapshot holds the values of all the variables and derived items
+        of the tree, which are resolved first if needed, e.g. in lazy mode,
+        along with what is needed to override and reload them later. It can
+        be pickled, provided the values can, and restored with
+        ``from_snapshot`` without parsing or validating anything. The values
+        of a frozen configuration are exported as tuples, frozensets, dicts
+        and arrays.
+        """
+        spec = _snapshot_spec(self.spec)
+        envs = dict(self._tree())
+        values: t.List[t.Any] = []
+        raws: t.List[t.Optional[str]] = []
+        deps: t.List[t.Optional[t.Tuple[str, ...]]] = []
+        for prefix, variables, derived in spec.layout:
+            env = envs[prefix]
+            store = env._store()
+            frozen = "_frozen" in env.__dict__
+            for name in variables + derived:
+                value = store[name] if name in store else getattr(env, name)
+                values.append(_thawed(value) if frozen else value)
+            raws.extend(map(env._raws.get, variables))
+            # Overridden derived items have no dependencies.
+            for name in derived:
+                item_deps = env._deps.get(name)
+                deps.append(tuple(sorted(item_deps)) if item_deps is not None else None)
+
+        return Snapshot(
+            _SNAPSHOT_VERSION,
+            spec.fingerprint,
+            _source_fingerprint(self),
+            dict(self.dynamic),
+            tuple(values),
+            tuple(raws),
+            tuple(deps),
+        )
 
-        self._full_prefix: str = (
-            parent._full_prefix if parent is not None else ""
-        ) + _normalized(self.__prefix__)
-        if self._full_prefix and not self._full_prefix.endswith("_"):
-            self._full_prefix += "_"
-
-        self.spec = self.__class__
-        derived = []
-        for name, e in list(self.__class__.__dict__.items()):
-            if isinstance(e, EnvVariable):
-                setattr(self, name, e(self, self._full_prefix))
-            elif isinstance(e, type) and issubclass(e, Env):
-                if e.__item__ is not None and e.__item__ != name:
-                    # Move the subclass to the __item__ attribute
-                    setattr(self.spec, e.__item__, e)
-                    delattr(self.spec, name)
-                    name = e.__item__
-                setattr(self, name, e(source, self))
-            elif isinstance(e, DerivedVariable):
-                derived.append((name, e))
-
-        for n, d in derived:
-            setattr(self, n, d(self))
+    @classmethod
+    def from_snapshot(
+        cls,
+        snapshot: Snapshot,
+        source: t.Optional[t.Union[t.Dict[str, str], BatchSource]] = None,
+    ) -> "Env":
+        """Create an instance of the configuration from a snapshot.
+
+        The values are restored as they are, without parsing or validating
+        them. A ``ValueError`` is raised if the snapshot was taken from a
+        different spec, or if the raw values of the variables in the source
+        have changed since.
+        """
+        if snapshot.version != _SNAPSHOT_VERSION:
+            raise ValueError(
+                "Unsupported snapshot version: {}".format(snapshot.version)
+            )
+        # A lazy instance has all its bookkeeping set up, but no values yet.
+        # It is created first, as the first instance completes the spec.
+        env = cls(source, dynamic=snapshot.dynamic, lazy=True)
+        spec = _snapshot_spec(cls)
+        if snapshot.spec != spec.fingerprint:
+            raise ValueError("The snapshot was taken from a different spec")
+        if snapshot.source != _source_fingerprint(env):
+            raise ValueError("The source has changed since the snapshot was taken")
+
+        env._restore(snapshot, spec.layout)
+
+        return env
+
+    @classmethod
+    def file_cached(
+        cls,
+        path: str,
+        source: t.Optional[t.Union[t.Dict[str, str], BatchSource]] = None,
+        dynamic: t.Optional[t.Dict[str, str]] = None,
+    ) -> "Env":
+        """Create an instance of the configuration, cached on disk.
+
+        The instance is restored from the snapshot stored at the given path,
+        without parsing, validating or deriving anything, if it was taken from
+        the same spec and the raw values of all the variables in the source
+        are unchanged. Otherwise the configuration is loaded, and the snapshot
+        file replaced atomically. Missing, corrupted and stale files are
+        ignored, and a ``RuntimeWarning`` is emitted if the snapshot cannot be
+        written.
+
+        Snapshots are pickles, and loading one can run arbitrary code, so the
+        path must be in a location that only trusted users can write to. On
+        POSIX systems, files that are not owned by the current user, or that
+        are writable by its group or by others, are ignored with a
+        ``RuntimeWarning``.
+        """
+        env = cls(source, dynamic=dynamic, lazy=True)
+        spec = _snapshot_spec(cls)
+
+        snapshot = _read_snapshot(path)
+        if (
+            snapshot is not None
+            and snapshot.version == _SNAPSHOT_VERSION
+            and snapshot.spec == spec.fingerprint
+            and snapshot.dynamic == env.dynamic
+            and snapshot.source == _source_fingerprint(env)
+        ):
+            # The snapshot was just read, and is not shared.
+            env._restore(snapshot, spec.layout, copy=False)
+            return env
+
+        if hasattr(env.source, "get_many"):
+            # Do not query the batch source again.
+            env = cls._preloaded(
+                t.cast(BatchSource, env.source), env._raw_source, env.dynamic
+            )
+        else:
+            env = cls(source, dynamic=dynamic)
+        _write_snapshot(path, env.snapshot())
+
+        return env
+
+    def publish(self, name: t.Optional[str] = None, min_items: int = 16) -> t.Any:
+        """Publish the configuration to shared memory.
+
+        The resolved values are written to a new
+        ``multiprocessing.shared_memory.SharedMemory`` segment, which other
+        processes on the same host can ``attach`` to. Lists, tuples, sets and
+        dicts of at least ``min_items`` strings or numbers, keyed by strings
+        for dicts, are stored in a compact layout that the attached instances
+        read in place, instead of holding their own copies. The other values
+        are pickled, like in a snapshot.
+
+        The segment is returned, and belongs to the caller, who must keep it
+        while processes attach to it, and ``close`` and ``unlink`` it when it
+        is no longer needed.
+        """
+        from multiprocessing import shared_memory
+        import pickle
+
+        snapshot = self.snapshot()
+        data = bytearray(_SHARED_HEADER_SIZE)
+        snapshot = snapshot._replace(
+            values=tuple(_share(_, data, min_items) for _ in snapshot.values)
+        )
+        payload = pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL)
+        data[:_SHARED_HEADER_SIZE] = (
+            _SHARED_MAGIC
+            + len(data).to_bytes(8, "little")
+            + len(payload).to_bytes(8, "little")
+        )
+        data += payload
+
+        memory = shared_memory.SharedMemory(name, create=True, size=len(data))
+        t.cast(memoryview, memory.buf)[: len(data)] = data
+
+        return memory
+
+    @classmethod
+    def attach(
+        cls,
+        name: str,
+        source: t.Optional[t.Union[t.Dict[str, str], BatchSource]] = None,
+    ) -> "Env":
+        """Create an instance of the configuration published to shared memory.
+
+        Nothing is parsed or validated. The collections stored in the compact
+        layout are exposed as read-only sequences, sets and mappings over the
+        shared memory, which stays mapped for as long as any of them is alive.
+        A ``ValueError`` is raised if the configuration was published from a
+        different spec, or if the raw values of the variables in the source
+        have changed since.
+        """
+        import pickle
+
+        memory = _attach_shared_memory(name)
+        buf = memory.buf
+        if bytes(buf[: len(_SHARED_MAGIC)]) != _SHARED_MAGIC:
+            memory.close()
+            raise ValueError("No configuration published as {}".format(name))
+        header = buf[len(_SHARED_MAGIC) : _SHARED_HEADER_SIZE]  # noqa
+        offset = int.from_bytes(header[:8], "little")
+        size = int.from_bytes(header[8:], "little")
+        header.release()
+
+        snapshot = pickle.loads(buf[offset : offset + size])  # noqa
+        snapshot = snapshot._replace(
+            values=tuple(
+                _shared_view(memory, _) if isinstance(_, _SharedValue) else _
+                for _ in snapshot.values
+            )
+        )
+
+        return cls.from_snapshot(snapshot, source)
+
+    def _restore(
+        self,
+        snapshot: Snapshot,
+        layout: t.Tuple[t.Tuple[str, t.Tuple[str, ...], t.Tuple[str, ...]], ...],
+        copy: bool = True,
+    ) -> None:
+        """Fill a lazy instance with the values of a snapshot.
+
+        Mutable collections are copied, so that the snapshot and the instances
+        restored from it do not share them, unless ``copy`` is unset.
+        """
+        envs = dict(self._tree())
+        for e in envs.values():
+            e.__dict__["_lazy"] = False
+
+        values, raws, deps = snapshot.values, snapshot.raws, snapshot.deps
+        i = j = k = 0
+        for prefix, variables, derived in layout:
+            e = envs[prefix]
+            store = e._store()
+            n = len(variables) + len(derived)
+            store.update(zip(variables + derived, values[i : i + n]))  # noqa
+            if copy:
+                for name in variables + derived:
+                    copier = _copier(store[name])
+                    if copier is not None:
+                        store[name] = copier(store[name])
+            e._raws.update(zip(variables, raws[j : j + len(variables)]))  # noqa
+            e._deps.update(
+                (name, frozenset(item_deps))
+                for name, item_deps in zip(derived, deps[k : k + len(derived)])  # noqa
+                if item_deps is not None
+            )
+            i, j, k = i + n, j + len(variables), k + len(derived)
+
+    def freeze(self, gc_freeze: bool = False) -> "Env":
+        """Make the configuration immutable, to share it with forked processes.
+
+        All the items of the tree are resolved, and the collections replaced
+        by immutable equivalents, recursively: tuples for lists, frozensets
+        for sets, read-only mapping proxies for dicts and read-only memory
+        views for arrays. Tuples and mappings of plain values are then ignored
+        by the garbage collector. The configuration can no longer be modified
+        or reloaded.
+
+        If ``gc_freeze`` is set, ``gc.freeze`` is called last, so that the
+        garbage collector of the processes forked afterwards does not write to
+        the memory of the configuration, nor to that of anything else created
+        so far. Returns the instance.
+        """
+        # The derived items are computed from the original values first.
+        items = []
+        for _, env in self._tree():
+            plan = _plan(env.spec)
+            names = [name for name, _ in plan.variables + plan.derived]
+            store = env._store()
+            for name in names:
+                if name not in store:
+                    getattr(env, name)
+            items.append((env, store, names))
+
+        for env, store, names in items:
+            for name in names:
+                store[name] = _frozen(store[name])
+            env.__dict__["_lazy"] = False
+            env.__dict__["_frozen"] = True
+
+        if gc_freeze:
+            gc.collect()
+            gc.freeze()
+
+        return self
+
+    def read_counts(self) -> t.Dict[str, int]:
+        """Return how many times each item of the tree has been read.
+
+        Reads are only counted when ``__track_reads__`` is set, in which case
+        the values are kept out of the instance dictionary, and every read,
+        including those made by derivations, goes through the descriptors of
+        the items. The counts are keyed by the paths of the variables and
+        derived items, and empty if reads are not tracked.
+        """
+        if "_values" not in self.__dict__:
+            return {}
+
+        return {
+            path + name: env._reads.get(name, 0)
+            for path, env in self._tree()
+            for name, _ in env.spec.items(include_derived=True)
+        }
+
+    def access_report(self, top: int = 10) -> AccessReport:
+        """Report the items that have never been read, and the most read ones.
+
+        The never read items are listed in declaration order, and the ``top``
+        most read items are listed with their read counts, most read first.
+        """
+        counts = self.read_counts()
+        most_read = sorted(
+            ((path, n) for path, n in counts.items() if n), key=lambda _: -_[1]
+        )
+        return AccessReport(
+            [path for path, n in counts.items() if not n], most_read[:top]
+        )
+
+    def load_stats(self) -> t.List[LoadStats]:
+        """Return the statistics recorded while loading the configuration.
+
+        Statistics are only recorded when ``__instrumented__`` is set, or when
+        a ``__load_hook__`` is set, which is called with each of them as they
+        are recorded. There is one entry per variable and derived item of the
+        tree, in load order, with its path, the environment name that provided
+        the value, if any, and whether it came from the ``"source"``, a
+        ``"deprecated"`` name, the ``"default"``, or was ``"derived"``. The
+        start time, from ``time.perf_counter``, is followed by the time spent,
+        in seconds, looking up, casting and validating the value, or deriving
+        it.
+        """
+        recorder = self.__dict__.get("_recorder")
+        if recorder is None:
+            return []
+
+        prefix = self._path
+        return [
+            stats._replace(path=stats.path[len(prefix) :])  # noqa
+            for stats in recorder.records
+            if stats.path.startswith(prefix)
+        ]
+
+    def _prefetch(self) -> t.Mapping[str, str]:
+        """Retrieve the values of all the variables in one round trip."""
+        return _prefetch(self.spec, t.cast(BatchSource, self.source), [self.dynamic])
 
     @classmethod
     def var(
@@ -297,6 +2736,7 @@ class Env(metaclass=EnvMeta):
         help: t.Optional[str] = None,
         help_type: t.Optional[str] = None,
         help_default: t.Optional[str] = None,
+        cache: int = 0,
     ) -> EnvVariable[T]:
         return EnvVariable(
             type,
@@ -310,6 +2750,7 @@ class Env(metaclass=EnvMeta):
             help,
             help_type,
             help_default,
+            cache,
         )
 
     @classmethod
@@ -326,6 +2767,7 @@ class Env(metaclass=EnvMeta):
         help: t.Optional[str] = None,
         help_type: t.Optional[str] = None,
         help_default: t.Optional[str] = None,
+        cache: int = 0,
     ) -> EnvVariable[T]:
         return EnvVariable(
             type,
@@ -339,41 +2781,121 @@ class Env(metaclass=EnvMeta):
             help,
             help_type,
             help_default,
+            cache,
         )
 
     @classmethod
     def der(
-        cls, type: t.Type[T], derivation: t.Callable[["Env"], T]
+        cls, type: t.Type[T], derivation: t.Callable[["Env"], T], lazy: bool = False
     ) -> DerivedVariable[T]:
-        return DerivedVariable(type, derivation)
+        return DerivedVariable(type, derivation, lazy)
 
     @classmethod
     def d(
-        cls, type: t.Type[T], derivation: t.Callable[["Env"], T]
+        cls, type: t.Type[T], derivation: t.Callable[["Env"], T], lazy: bool = False
     ) -> DerivedVariable[T]:
-        return DerivedVariable(type, derivation)
+        return DerivedVariable(type, derivation, lazy)
 
     @classmethod
     def items(
         cls, recursive: bool = False, include_derived: bool = False
     ) -> t.Iterator[t.Tuple[str, t.Union[EnvVariable, DerivedVariable]]]:
-        classes = (EnvVariable, DerivedVariable) if include_derived else (EnvVariable,)
-        q: t.Deque[t.Tuple[t.Tuple[str], t.Type["Env"]]] = deque()
-        path: t.Tuple[str] = tuple()  # type: ignore[assignment]
-        q.append((path, cls))
-        while q:
-            path, env = q.popleft()
-            for k, v in env.__dict__.items():
-                if isinstance(v, classes):
-                    yield (
-                        ".".join((*path, k)),
-                        t.cast(t.Union[EnvVariable, DerivedVariable], v),
-                    )
-                elif isinstance(v, type) and issubclass(v, Env) and recursive:
-                    item_name = getattr(v, "__item__", k)
-                    if item_name is None:
-                        item_name = k
-                    q.append(((*path, item_name), v))  # type: ignore[arg-type]
+        _index(cls)
+        _, _, views = cls.__index__
+        return iter(t.cast(dict, views)[(recursive, include_derived)])
+
+    @classmethod
+    def index(cls) -> SpecIndex:
+        """Return the flattened index of the configuration items.
+
+        The index lists all the variables and derived items in the tree, in
+        the same order as ``items(recursive=True, include_derived=True)``, as
+        entries with the dotted path of the item, the item itself and the Env
+        subclass that declares it. The entries can also be looked up by path
+        with ``by_path``, and the variables by environment name with
+        ``by_name``. The latter includes private and deprecated names. The
+        variables with dynamic names are listed in ``dynamic``, with a pattern
+        matching their names.
+        """
+        return _index(cls)
+
+    @classmethod
+    def declared(
+        cls, source: t.Optional[t.Mapping[str, str]] = None
+    ) -> t.Dict[str, IndexEntry]:
+        """Return the keys of the source that belong to the configuration.
+
+        Each key of the source, which defaults to ``os.environ``, is mapped to
+        the entry of the variable that declares it, either as its full name or
+        as a deprecated one. The cost is linear in the size of the source.
+        """
+        index = _index(cls)
+        by_name, dynamic = index.by_name, index.dynamic
+        declared = {}
+        for key in source if source is not None else os.environ:
+            entry = by_name.get(key)
+            if entry is None and dynamic:
+                entry = next((e for p, e in dynamic if p.fullmatch(key)), None)
+            if entry is not None:
+                declared[key] = entry
+
+        return declared
+
+    @classmethod
+    def unknown(
+        cls, source: t.Optional[t.Mapping[str, str]] = None, max_distance: int = 2
+    ) -> t.Dict[str, t.List[str]]:
+        """Return the keys of the source that look like undeclared variables.
+
+        These are the keys of the source, which defaults to ``os.environ``,
+        that start with the prefix of the configuration, but that match none
+        of the names of its variables, e.g. because of a typo. Each of them is
+        mapped to the names of the variables within ``max_distance`` edits,
+        closest first.
+
+        Without a prefix, there is no telling the keys meant for the
+        configuration from the rest of the environment, so nothing is
+        reported.
+        """
+        prefix = _normalized(cls.__prefix__)
+        if not prefix:
+            return {}
+        prefixes = (f"{prefix}_", f"_{prefix}_")
+
+        index = _index(cls)
+        by_name, dynamic = index.by_name, index.dynamic
+        unknown: t.Dict[str, t.List[str]] = {
+            key: []
+            for key in (source if source is not None else os.environ)
+            if key.startswith(prefixes)
+            and key not in by_name
+            and not any(p.fullmatch(key) for p, _ in dynamic)
+        }
+
+        if unknown:
+            trie = _names_trie(cls)
+            for key, suggestions in unknown.items():
+                for _, name in trie.search(key, max_distance):
+                    # Suggest the current name of deprecated variables.
+                    name = index.by_name[name].item.full_name
+                    if name not in suggestions:
+                        suggestions.append(name)
+
+        return unknown
+
+    @classmethod
+    def deprecation_hits(cls) -> t.Dict[t.Tuple[str, str], int]:
+        """Return how many times deprecated names provided a value.
+
+        The counts are keyed by the pairs of deprecated and current names of
+        all the variables in the tree, and cover all the instances created so
+        far.
+        """
+        hits: t.Dict[t.Tuple[str, str], int] = {}
+        for v in cls.values(recursive=True):
+            if isinstance(v, EnvVariable):
+                hits.update(v._deprecation_hits or {})
+        return hits
 
     @classmethod
     def keys(
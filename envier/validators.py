@@ -1,30 +1,72 @@
+import array
+import builtins
 import typing as t
 
 
 T = t.TypeVar("T")
 
 
+def _items(value: t.Any) -> t.Optional[t.Sequence]:
+    """Return the items of a range or of an array of numbers, if it is one."""
+    if isinstance(value, (builtins.range, array.array, memoryview)):
+        return value
+    return None
+
+
+def _among(items: t.Sequence, choices: t.Iterable) -> bool:
+    """Tell whether all the items are among the choices."""
+    if isinstance(items, builtins.range) and items:
+        if isinstance(choices, builtins.range) and abs(choices.step) == 1:
+            # Both ranges have no gaps, so the bounds are enough.
+            return items[0] in choices and items[-1] in choices
+        # The items of a range are distinct, so they cannot all be among fewer
+        # choices, and there are at most as many checks as choices otherwise.
+        if isinstance(choices, t.Sized) and len(items) > len(choices):
+            return False
+    return all(_ in choices for _ in items)
+
+
 def choice(choices: t.Iterable) -> t.Callable[[T], None]:
     """
-    A validator that checks if the value is one of the choices.
+    A validator that checks if the value is one of the choices. For ranges and
+    arrays of numbers, all the items must be. Ranges are checked by their
+    bounds when the choices are a range with no gaps.
     """
 
     def validate(value):
         # type (T) -> None
-        if value is not None and value not in choices:
-            raise ValueError("value must be one of %r" % sorted(choices))
+        items = _items(value)
+        if items is None:
+            items = () if value is None else (value,)
+        if not _among(items, choices):
+            # Ranges of choices are not expanded.
+            shown = choices if isinstance(choices, builtins.range) else sorted(choices)
+            raise ValueError("value must be one of %r" % (shown,))
 
     return validate
 
 
 def range(min_value: int, max_value: int) -> t.Callable[[T], None]:
     """
-    A validator that checks if the value is in the range.
+    A validator that checks if the value is in the range. For ranges and arrays
+    of numbers, all the items must be. Ranges are checked by their bounds only.
     """
 
     def validate(value):
         # type (T) -> None
-        if value is not None and not (min_value <= value <= max_value):
+        items = _items(value)
+        if items is None:
+            if value is None:
+                return
+            low = high = value
+        elif not len(items):
+            return
+        elif isinstance(items, builtins.range):
+            low, high = sorted((items[0], items[-1]))
+        else:
+            low, high = min(items), max(items)
+
+        if not (min_value <= low and high <= max_value):
             raise ValueError("value must be in range [%r, %r]" % (min_value, max_value))
 
     return validate
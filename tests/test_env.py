@@ -1,10 +1,27 @@
+import array
+from concurrent.futures import ThreadPoolExecutor
+import gc
+import os
+import pickle
+import subprocess
+import sys
+import time
+import typing as t
 from typing import Optional
+from unittest import mock
+import warnings
 
 import pytest
 
 from envier import En
 from envier import Env
+from envier import FloatArray
 from envier import HelpInfo
+from envier import IntArray
+from envier.env import DerivedVariable
+from envier.env import EnvVariable
+from envier.env import _Tracker
+from envier.env import _plan
 
 
 def test_env_default():
@@ -278,7 +295,7 @@ def test_env_include_namespace(monkeypatch):
         (int, [1, 2, 3, 4, 5]),
     ],
 )
-@pytest.mark.parametrize("_type", [list, set, tuple])
+@pytest.mark.parametrize("_type", [list, set, frozenset, tuple])
 def test_env_collections(monkeypatch, _type, map, expected):
     monkeypatch.setenv("FOO", "1,2,3,4,5")
 
@@ -431,3 +448,1260 @@ def test_env_items(monkeypatch):
         ("service.port", GlobalConfig.ServiceConfig.port),
         ("service._private", GlobalConfig.ServiceConfig._private),
     ]
+
+
+def test_env_plan_follows_include():
+    class GlobalConfig(Env):
+        __prefix__ = "myapp"
+
+        debug_mode = Env.var(bool, "debug", default=False)
+
+    class ServiceConfig(Env):
+        __prefix__ = "service"
+
+        host = Env.var(str, "host", default="localhost")
+        port = Env.var(int, "port", default=3000)
+
+    assert [n for n, _ in _plan(GlobalConfig).variables] == ["debug_mode"]
+
+    GlobalConfig.include(ServiceConfig)
+    GlobalConfig.include(ServiceConfig, namespace="service")
+
+    assert [n for n, _ in _plan(GlobalConfig).variables] == [
+        "debug_mode",
+        "host",
+        "port",
+    ]
+    assert [n for n, _ in _plan(GlobalConfig).nested] == ["service"]
+
+    config = GlobalConfig()
+    assert config.host == "localhost"
+    assert config.service.port == 3000
+
+
+def test_env_plan_relocation():
+    class GlobalConfig(Env):
+        class ServiceConfig(Env):
+            __item__ = "service"
+
+            port = Env.var(int, "port", default=3000)
+
+    assert _plan(GlobalConfig).relocations == (("ServiceConfig", "service"),)
+
+    assert GlobalConfig().service.port == 3000
+    assert GlobalConfig().service.port == 3000
+
+    assert _plan(GlobalConfig).relocations == ()
+    assert "ServiceConfig" not in GlobalConfig.__dict__
+
+
+@pytest.mark.parametrize("flag", [True, False])
+def test_env_lazy(monkeypatch, flag):
+    monkeypatch.setenv("MYAPP_PORT", "8080")
+    calls = []
+
+    def validate(value):
+        calls.append(value)
+
+    class Config(Env):
+        __prefix__ = "myapp"
+        __lazy__ = flag
+
+        port = Env.var(int, "port", validator=validate)
+        mandatory = Env.var(str, "mandatory")
+        double = Env.der(int, lambda c: c.port * 2)
+
+        class ServiceConfig(Env):
+            __item__ = __prefix__ = "service"
+
+            host = Env.var(str, "host", default="localhost")
+
+    config = Config() if flag else Config(lazy=True)
+    assert calls == []
+    assert "port" not in config.__dict__
+
+    assert config.double == 16160
+    assert config.port == 8080
+    assert calls == [8080]
+    assert config.__dict__["port"] == 8080
+
+    assert config.service._lazy
+    assert config.service.host == "localhost"
+
+    with pytest.raises(KeyError):
+        config.mandatory
+
+    assert isinstance(Config.port, EnvVariable)
+    assert isinstance(Config.double, DerivedVariable)
+
+
+def test_env_lazy_include():
+    class GlobalConfig(Env):
+        __lazy__ = True
+
+    class ServiceConfig(Env):
+        port = Env.var(int, "port", default=3000)
+
+    GlobalConfig.include(ServiceConfig)
+
+    assert GlobalConfig().port == 3000
+
+
+@pytest.mark.parametrize("codegen", [True, False])
+def test_env_codegen(monkeypatch, codegen):
+    monkeypatch.setenv("MYAPP_PORT", "8080")
+    monkeypatch.setenv("MYAPP_OLD_HOST", "example.com")
+    monkeypatch.setenv("MYAPP_SERVICE_PORT", "9090")
+
+    class ServiceConfig(Env):
+        __prefix__ = "service"
+        __codegen__ = codegen
+
+        port = Env.var(int, "port", default=3000)
+
+    # Generate the loader before the names change.
+    assert ServiceConfig().port == 3000
+
+    class Config(Env):
+        __prefix__ = "myapp"
+        __codegen__ = codegen
+
+        port = Env.var(int, "port", validator=lambda v: None)
+        host = Env.var(str, "host", deprecations=[("old_host", None, None)])
+        debug = Env.var(bool, "debug", default=False)
+        mandatory = Env.var(str, "mandatory", default="yes")
+        double = Env.der(int, lambda c: c.port * 2)
+
+        service = ServiceConfig
+
+    with pytest.warns(DeprecationWarning):
+        config = Config()
+
+    assert config.port == 8080
+    assert config.host == "example.com"
+    assert config.debug is False
+    assert config.double == 16160
+    assert config.service.port == 9090
+    assert (Config.__loader__[1] is not None) is codegen
+
+    class MandatoryConfig(Env):
+        __codegen__ = codegen
+
+        foo = Env.var(int, "foo", validator=lambda v: None)
+
+    with pytest.raises(KeyError):
+        MandatoryConfig()
+
+
+@pytest.mark.parametrize(
+    "_type,raw,expected",
+    [
+        (t.Union[int, str], "42", 42),
+        (t.Union[int, str], " 4_2 ", 42),
+        (t.Union[int, str], "abc", "abc"),
+        (t.Union[str, int], "42", "42"),
+        (t.Union[int, float], "1e3", 1000.0),
+        (t.Union[int, float, str], "-inf", float("-inf")),
+        (t.Union[float, str], "1.5.2", "1.5.2"),
+        (t.Union[int, list], "1,2", ["1", "2"]),
+        (t.Optional[int], "7", 7),
+    ],
+)
+def test_env_union(monkeypatch, _type, raw, expected):
+    monkeypatch.setenv("FOO", raw)
+
+    class Config(Env):
+        foo = Env.var(_type, "FOO", default=_type.__args__[0]())
+
+    for _ in range(2):  # The second time, the resolution is cached
+        assert Config().foo == expected
+
+
+def test_env_union_no_match(monkeypatch):
+    monkeypatch.setenv("FOO", "abc")
+
+    class Config(Env):
+        foo = Env.var(t.Optional[int], "FOO", default=None)
+
+    with pytest.raises(TypeError, match="cannot cast abc"):
+        Config()
+
+
+def test_env_var_cache(monkeypatch):
+    monkeypatch.setenv("FOO", "1,2,3")
+    calls = []
+
+    def parse(raw):
+        calls.append(raw)
+        return [int(_) for _ in raw.split(",")]
+
+    class Config(Env):
+        foo = Env.var(list, "FOO", parser=parse, cache=2)
+        bar = Env.var(list, "BAR", parser=parse, default=[])
+        baz = Env.var(
+            dict, "BAZ", map=lambda k, v: (k, v.split("|")), default={}, cache=2
+        )
+
+    monkeypatch.setenv("BAZ", "a:1|2")
+    first = Config()
+    first.foo.append(4)
+    first.baz["a"].append("3")
+    second = Config()
+
+    assert second.foo == [1, 2, 3]
+    assert second.baz == {"a": ["1", "2"]}
+    assert calls == ["1,2,3"]
+    assert Config.foo.cache_info() == (1, 1, 2, 1)
+    assert Config.bar.cache_info() is None
+
+    for raw in ("1", "2", "3"):
+        monkeypatch.setenv("FOO", raw)
+        Config()
+    assert Config.foo.cache_info().currsize == 2
+
+    Config.foo.cache_clear()
+    assert Config.foo.cache_info() == (0, 0, 2, 0)
+
+
+class BatchDict(dict):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+
+    def get(self, key, default=None):
+        raise AssertionError("get_many should be used instead")
+
+    def get_many(self, keys):
+        self.requests.append(list(keys))
+        return {k: self[k] for k in self.requests[-1] if k in self}
+
+
+def test_env_batch_source():
+    source = BatchDict(
+        {"MYAPP_OLD_DEBUG": "1", "MYAPP_SERVICE_PORT": "8080", "MYAPP_T1_NAME": "t"}
+    )
+
+    class Config(Env):
+        __prefix__ = "myapp"
+
+        debug = Env.var(bool, "debug", deprecations=[("old.debug", None, None)])
+        name = Env.var(str, "{tenant}.name")
+
+        class ServiceConfig(Env):
+            __item__ = __prefix__ = "service"
+
+            port = Env.var(int, "port", default=3000)
+
+    with pytest.warns(DeprecationWarning):
+        config = Config(source, dynamic={"tenant": "t1"})
+
+    assert config.debug is True
+    assert config.name == "t"
+    assert config.service.port == 8080
+    assert source.requests == [
+        ["MYAPP_DEBUG", "MYAPP_OLD_DEBUG", "MYAPP_T1_NAME", "MYAPP_SERVICE_PORT"]
+    ]
+
+
+def test_env_reload():
+    source = {"MYAPP_PORT": "8080", "MYAPP_SERVICE_HOST": "a.com"}
+    calls = []
+
+    def validate(value):
+        calls.append(value)
+        if value < 0:
+            raise ValueError("negative port")
+
+    class Config(Env):
+        __prefix__ = "myapp"
+
+        port = Env.var(int, "port", validator=validate)
+        debug = Env.var(bool, "debug", default=False)
+        double = Env.der(int, lambda c: c.port * 2)
+        url = Env.der(str, lambda c: f"http://{c.service.host}:{c.port}")
+
+        class ServiceConfig(Env):
+            __item__ = __prefix__ = "service"
+
+            host = Env.var(str, "host", default="localhost")
+            upper = Env.der(str, lambda c: c.host.upper())
+
+    config = Config(source)
+    assert calls == [8080]
+
+    assert config.reload() == []
+    assert calls == [8080]
+
+    source["MYAPP_SERVICE_HOST"] = "b.com"
+    source["MYAPP_DEBUG"] = "false"
+    assert config.reload() == ["service.host", "service.upper", "url"]
+    assert config.url == "http://b.com:8080"
+    assert calls == [8080]
+
+    # service.upper has not been recomputed since it was invalidated.
+    assert config.reload({"MYAPP_PORT": "80"}) == [
+        "port",
+        "service.host",
+        "double",
+        "url",
+    ]
+    assert config.double == 160
+    assert config.service.host == "localhost"
+    assert calls == [8080, 80]
+
+    new_source = {"MYAPP_PORT": "-1"}
+    with pytest.raises(ValueError):
+        config.reload(new_source)
+    assert config.port == 80
+    assert config.source is not new_source
+
+
+def test_env_reload_indirect_reads():
+    source = {"Q_Y": "7", "Q_R_X": "1"}
+
+    class Config(Env):
+        __prefix__ = "q"
+
+        y = Env.var(int, "y")
+
+        def scaled(self, factor):
+            return self.y * factor
+
+        @property
+        def offset(self):
+            return self.r.x + 1
+
+        tripled = Env.der(int, lambda c: c.scaled(3))
+        shifted = Env.der(int, lambda c: c.y + c.offset)
+
+        class R(Env):
+            __item__ = __prefix__ = "r"
+
+            x = Env.var(int, "x")
+            dd = Env.der(int, lambda c: c.parent.y * 2)
+
+    config = Config(source)
+    assert (config.r.dd, config.tripled, config.shifted) == (14, 21, 9)
+    assert config.r._deps["dd"] == frozenset({"parent.y"})
+
+    source["Q_Y"] = "8"
+    assert config.reload() == ["y", "r.dd", "tripled", "shifted"]
+    assert (config.r.dd, config.tripled, config.shifted) == (16, 24, 10)
+
+    source["Q_R_X"] = "2"
+    assert config.reload() == ["r.x", "shifted"]
+    assert config.shifted == 11
+
+    config.y = 9
+    assert (config.r.dd, config.tripled, config.shifted) == (18, 27, 12)
+
+
+def test_env_derived_proxy():
+    class Config(Env):
+        port = Env.var(int, "port", default=80)
+        kind = Env.der(type, lambda c: type(c))
+        check = Env.der(bool, lambda c: isinstance(c, Config))
+        getter = Env.der(object, lambda c: lambda: c.port)
+
+    config = Config()
+
+    # Derivations get a proxy to the instance.
+    assert config.kind is _Tracker and config.check is True
+
+    # A proxy kept by a derivation reads the current values, but the reads
+    # made through it later are not dependencies.
+    getter = config.getter
+    config.port = 90
+    assert getter() == 90
+    assert config.getter is getter and config._deps["getter"] == frozenset()
+
+
+def test_env_derived_dependencies():
+    calls = []
+
+    def derivation(name, func):
+        def derive(c):
+            calls.append(name)
+            return func(c)
+
+        return derive
+
+    class Config(Env):
+        port = Env.var(int, "port", default=80)
+        host = Env.var(str, "host", default="localhost")
+        double = Env.der(int, derivation("double", lambda c: c.port * 2))
+        quad = Env.der(int, derivation("quad", lambda c: c.double * 2))
+        table = Env.der(
+            dict, derivation("table", lambda c: {c.service.name: 1}), lazy=True
+        )
+        check = Env.der(bool, derivation("check", lambda c: isinstance(c, Config)))
+
+        class ServiceConfig(Env):
+            __item__ = "service"
+
+            name = Env.var(str, "name", default="svc")
+
+    config = Config({"OTHER": "1"})
+    assert calls == ["double", "quad", "check"]
+    assert config.check is True
+    assert Config.double._attr == "double"
+
+    assert config.table == {"svc": 1}
+    assert calls[-1] == "table"
+
+    calls.clear()
+    config.port = 100
+    assert calls == []
+    assert config.quad == 400
+    assert calls == ["quad", "double"]
+
+    calls.clear()
+    config.host = "example.com"
+    config.service.name = "other"
+    assert config.double == 200
+    assert config.table == {"other": 1}
+    assert calls == ["table"]
+
+    # An overridden derived item is pinned.
+    config.double = 1
+    assert config.quad == 2
+    config.port = 5
+    assert config.double == 1
+
+
+def test_env_index():
+    class GlobalConfig(Env):
+        __prefix__ = "myapp"
+
+        debug_mode = Env.var(bool, "debug", default=False)
+
+        class ServiceConfig(Env):
+            __item__ = __prefix__ = "service"
+
+            host = Env.var(str, "host", default="localhost")
+            url = Env.der(str, lambda c: f"http://{c.host}")
+
+    index = GlobalConfig.index()
+    assert [_.path for _ in index.entries] == [
+        "debug_mode",
+        "service.host",
+        "service.url",
+    ]
+    assert index.by_path["service.url"].item is GlobalConfig.ServiceConfig.url
+
+    entry = index.by_name["MYAPP_SERVICE_HOST"]
+    assert entry.path == "service.host"
+    assert entry.owner is GlobalConfig.ServiceConfig
+    assert GlobalConfig.index() is index
+
+    class ExtraConfig(Env):
+        __prefix__ = "extra"
+
+        port = Env.var(int, "port", default=3000)
+
+    GlobalConfig.include(ExtraConfig, namespace="extra")
+
+    index = GlobalConfig.index()
+    assert index.by_name["MYAPP_EXTRA_PORT"].path == "extra.port"
+    assert list(GlobalConfig.keys()) == ["debug_mode"]
+    assert list(GlobalConfig.keys(recursive=True)) == [
+        "debug_mode",
+        "service.host",
+        "extra.port",
+    ]
+
+
+def test_env_declared():
+    class GlobalConfig(Env):
+        __prefix__ = "myapp"
+
+        debug_mode = Env.var(
+            bool, "debug", default=False, deprecations=[("old.debug", None, None)]
+        )
+        secret = Env.var(str, "secret", default="", private=True)
+        name = Env.var(str, "{tenant}.name", default="")
+
+        class ServiceConfig(Env):
+            __item__ = __prefix__ = "service"
+
+            port = Env.var(int, "port", default=3000)
+
+    index = GlobalConfig.index()
+    assert index.by_name["MYAPP_OLD_DEBUG"].path == "debug_mode"
+    assert index.by_name["_MYAPP_SECRET"].path == "secret"
+
+    source = {
+        "MYAPP_DEBUG": "1",
+        "MYAPP_OLD_DEBUG": "1",
+        "_MYAPP_SECRET": "s",
+        "MYAPP_T1_NAME": "t1",
+        "MYAPP_SERVICE_PORT": "80",
+        "MYAPP_UNKNOWN": "1",
+        "PATH": "/bin",
+    }
+    assert {k: e.path for k, e in GlobalConfig.declared(source).items()} == {
+        "MYAPP_DEBUG": "debug_mode",
+        "MYAPP_OLD_DEBUG": "debug_mode",
+        "_MYAPP_SECRET": "secret",
+        "MYAPP_T1_NAME": "name",
+        "MYAPP_SERVICE_PORT": "service.port",
+    }
+
+
+def test_env_unknown():
+    class GlobalConfig(Env):
+        __prefix__ = "dd"
+
+        sample_rate = Env.var(
+            float,
+            "trace.sample.rate",
+            default=1.0,
+            deprecations=[("sample.rate", None, None)],
+        )
+        secret = Env.var(str, "secret", default="", private=True)
+        name = Env.var(str, "{tenant}.name", default="")
+
+        class ServiceConfig(Env):
+            __item__ = __prefix__ = "service"
+
+            port = Env.var(int, "port", default=3000)
+
+    source = {
+        "DD_TRACE_SAMPLE_RATE": "0.5",
+        "DD_TRACE_SAMPL_RATE": "0.5",
+        "DD_SAMPLE_RATES": "0.5",
+        "_DD_SECRT": "s",
+        "DD_T1_NAME": "t1",
+        "DD_SERVICE_PORTS": "80",
+        "DD_SOMETHING_ELSE": "1",
+        "PATH": "/bin",
+    }
+    assert GlobalConfig.unknown(source) == {
+        "DD_TRACE_SAMPL_RATE": ["DD_TRACE_SAMPLE_RATE"],
+        "DD_SAMPLE_RATES": ["DD_TRACE_SAMPLE_RATE"],
+        "_DD_SECRT": ["_DD_SECRET"],
+        "DD_SERVICE_PORTS": ["DD_SERVICE_PORT"],
+        "DD_SOMETHING_ELSE": [],
+    }
+    assert GlobalConfig.unknown({"DD_TRACE_SAMPLE_RATE": "0.5"}) == {}
+
+    # Without a prefix, the keys of the source are not reported.
+    class Config(Env):
+        port = Env.var(int, "port", default=3000)
+
+    assert Config.unknown({"PORTS": "80", "PATH": "/bin"}) == {}
+
+
+def test_env_deprecation_hits():
+    class Config(Env):
+        __prefix__ = "myapp"
+
+        foo = Env.var(int, "foo", deprecations=[("old.foo", None, None)])
+        bar = Env.var(int, "{tenant}.bar", deprecations=[("{tenant}.baz", None, None)])
+
+    source = {"MYAPP_OLD_FOO": "1", "MYAPP_A_BAZ": "2"}
+    with pytest.warns(DeprecationWarning) as record:
+        Config(source, dynamic={"tenant": "a"})
+    assert len(record) == 2
+
+    # Each pair of names is warned about only once.
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        Config(source, dynamic={"tenant": "a"})
+
+    assert Config.deprecation_hits() == {
+        ("MYAPP_OLD_FOO", "MYAPP_FOO"): 2,
+        ("MYAPP_A_BAZ", "MYAPP_A_BAR"): 2,
+    }
+    assert Config.foo.deprecation_hits() == {("MYAPP_OLD_FOO", "MYAPP_FOO"): 2}
+
+    Config.__deprecation_interval__ = 0
+    with pytest.warns(DeprecationWarning) as record:
+        Config(source, dynamic={"tenant": "a"})
+    assert [str(_.message) for _ in record] == [
+        "MYAPP_OLD_FOO has been deprecated. Use MYAPP_FOO instead",
+        "MYAPP_A_BAZ has been deprecated. Use MYAPP_A_BAR instead",
+    ]
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_env_load_for(batch):
+    class Config(Env):
+        __prefix__ = "myapp"
+
+        host = Env.var(str, "{tenant}.host", default="localhost")
+        port = Env.var(int, "port", default=8080)
+        tags = Env.var(list, "tags", default=[])
+        groups = Env.var(tuple, "groups", parser=lambda r: ([r],), default=())
+        url = Env.der(str, lambda c: f"{c.host}:{c.port}")
+        base = Env.der(int, lambda c: c.port + 1)
+        tenant = Env.der(str, lambda c: c.dynamic["TENANT"])
+
+        class Service(Env):
+            __item__ = __prefix__ = "service"
+
+            name = Env.var(str, "name", default="svc")
+
+    source = {
+        "MYAPP_A_HOST": "a.example",
+        "MYAPP_B_HOST": "b.example",
+        "MYAPP_PORT": "80",
+        "MYAPP_TAGS": "x,y",
+        "MYAPP_GROUPS": "g",
+        "MYAPP_SERVICE_NAME": "api",
+    }
+    if batch:
+        source = BatchDict(source)
+    dynamics = [{"tenant": "a"}, {"tenant": "b"}, {"tenant": "c"}]
+
+    envs = Config.load_for(dynamics, source)
+    expected = [Config(source, dynamic=d) for d in dynamics]
+    for env, other in zip(envs, expected):
+        for name in ("host", "port", "tags", "url", "base", "tenant"):
+            assert getattr(env, name) == getattr(other, name)
+        assert env._raws == other._raws
+        assert env.service.name == "api" and env.service.parent is env
+        assert env.source is source
+    assert [_.url for _ in envs] == ["a.example:80", "b.example:80", "localhost:80"]
+    # Derivations reading the dynamic values are computed for each context.
+    assert [_.tenant for _ in envs] == ["A", "B", "C"]
+    if batch:
+        # One request for all the contexts, and one for each instance.
+        assert len(source.requests) == 1 + len(dynamics)
+
+    # Mutable values are not shared between the instances.
+    envs[0].tags.append("z")
+    envs[0].groups[0].append("h")
+    assert envs[1].tags == ["x", "y"] and envs[1].groups == (["g"],)
+
+    # Overrides still invalidate the derived items of the copies.
+    envs[1].port = 90
+    assert envs[1].url == "b.example:90"
+    assert envs[0].url == "a.example:80"
+
+    assert Config.load_for([], source) == []
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_env_load_for_instrumented(batch):
+    class Config(Env):
+        __instrumented__ = True
+
+        host = Env.var(str, "{tenant}.host", default="localhost")
+        port = Env.var(int, "port", default=8080)
+
+        class Service(Env):
+            __item__ = "service"
+
+            name = Env.var(str, "name", default="svc")
+
+    source = {"A_HOST": "a.example", "PORT": "80"}
+    if batch:
+        source = BatchDict(source)
+    envs = Config.load_for([{"tenant": "a"}, {"tenant": "b"}], source)
+
+    # Each instance records its own load.
+    assert envs[0]._recorder is not envs[1]._recorder
+    for env, host in zip(envs, ("A_HOST", None)):
+        assert [(_.path, _.name) for _ in env.load_stats()] == [
+            ("host", host),
+            ("port", "PORT"),
+            ("service.name", None),
+        ]
+    if batch:
+        assert len(source.requests) == 1
+
+
+def test_env_cached(monkeypatch):
+    class Config(Env):
+        __prefix__ = "myapp"
+
+        host = Env.var(str, "{tenant}.host", default="localhost")
+        port = Env.var(int, "port", default=8080)
+
+    source = {"MYAPP_A_HOST": "a.example", "MYAPP_PORT": "80"}
+
+    a = Config.cached(source, dynamic={"tenant": "a"})
+    assert (a.host, a.port) == ("a.example", 80)
+    assert Config.cached(source, dynamic={"TENANT": "A"}) is a
+    b = Config.cached(source, dynamic={"tenant": "b"})
+    assert b is not a and b.host == "localhost"
+    assert Config.cached_info() == (1, 2, 128, 2)
+
+    # A change in the source loads the instance again.
+    source["MYAPP_PORT"] = "90"
+    a2 = Config.cached(source, dynamic={"tenant": "a"})
+    assert a2 is not a and a2.port == 90
+    assert Config.cached(source, dynamic={"tenant": "a"}) is a2
+
+    # Sources with the same values share the instances.
+    assert Config.cached(dict(source), dynamic={"tenant": "a"}) is a2
+
+    # Declaring other specs does not invalidate the instances, unlike changes
+    # to the items of the spec.
+    class Other(Env):
+        foo = Env.var(int, "foo", default=0)
+
+    assert Config.cached(source, dynamic={"tenant": "a"}) is a2
+    Config.debug = Env.var(bool, "debug", default=False)
+    a3 = Config.cached(source, dynamic={"tenant": "a"})
+    assert a3 is not a2 and a3.debug is False
+    del Config.debug
+
+    # Eviction by size and by age.
+    Config.__instances_size__ = 1
+    Config.cached(source, dynamic={"tenant": "c"})
+    assert Config.cached_info().currsize == 1
+    assert Config.cached(source, dynamic={"tenant": "a"}) is not a2
+
+    Config.__instances_ttl__ = 10
+    d = Config.cached(source, dynamic={"tenant": "d"})
+    assert Config.cached(source, dynamic={"tenant": "d"}) is d
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 20)
+    assert Config.cached(source, dynamic={"tenant": "d"}) is not d
+
+    Config.cached_clear()
+    assert Config.cached_info() == (0, 0, 1, 0)
+
+
+def test_env_cached_batch():
+    class Config(Env):
+        port = Env.var(int, "port", default=8080)
+
+    source = BatchDict({"PORT": "80"})
+    config = Config.cached(source)
+    assert config.port == 80 and config.source is source
+    assert Config.cached(source) is config
+    assert len(source.requests) == 2
+
+    # Values retrieved from a batch source are never mistaken for an empty
+    # source falling back to os.environ.
+    assert Config.cached(BatchDict()).port == 8080
+
+
+def test_env_cached_threads():
+    class Config(Env):
+        port = Env.var(int, "port", default=8080)
+
+    source = {"PORT": "80"}
+    with ThreadPoolExecutor(8) as pool:
+        envs = list(pool.map(lambda _: Config.cached(source), range(100)))
+
+    assert all(_.port == 80 for _ in envs)
+    info = Config.cached_info()
+    assert info.hits + info.misses == 100 and info.currsize == 1
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_env_load_stats(lazy):
+    spans = []
+
+    class Config(Env):
+        __prefix__ = "myapp"
+        __load_hook__ = spans.append
+
+        foo = Env.var(int, "foo", default=1)
+        bar = Env.var(int, "bar", deprecations=[("old.bar", None, None)])
+        baz = Env.var(int, "baz", validator=lambda _: None)
+        double = Env.der(int, lambda c: c.foo * 2)
+
+        class Service(Env):
+            __item__ = __prefix__ = "service"
+
+            port = Env.var(int, "port", default=80)
+
+    with pytest.warns(DeprecationWarning):
+        config = Config({"MYAPP_OLD_BAR": "2", "MYAPP_BAZ": "3"}, lazy=lazy)
+        if lazy:
+            config.foo, config.bar, config.baz, config.service.port, config.double
+
+    stats = config.load_stats()
+    assert stats == spans
+    assert {(_.path, _.name, _.origin) for _ in stats} == {
+        ("foo", None, "default"),
+        ("bar", "MYAPP_OLD_BAR", "deprecated"),
+        ("baz", "MYAPP_BAZ", "source"),
+        ("double", None, "derived"),
+        ("service.port", None, "default"),
+    }
+    assert all(
+        _.lookup >= 0 and _.cast >= 0 and _.validate >= 0 and _.derive >= 0
+        for _ in stats
+    )
+    assert [(_.path, _.origin) for _ in config.service.load_stats()] == [
+        ("port", "default")
+    ]
+
+
+def test_env_load_stats_lookups():
+    class CountingDict(dict):
+        def get(self, key, default=None):
+            self.gets = getattr(self, "gets", 0) + 1
+            return super().get(key, default)
+
+    class Config(Env):
+        __instrumented__ = True
+
+        foo = Env.var(int, "foo", default=1)
+        bar = Env.var(int, "bar", deprecations=[("old.bar", None, None)])
+        baz = Env.var(int, "baz")
+
+    source = CountingDict({"OLD_BAR": "2", "BAZ": "3"})
+    with pytest.warns(DeprecationWarning):
+        config = Config(source)
+
+    # The source is only queried once per name.
+    assert source.gets == 4
+    assert [(_.name, _.origin) for _ in config.load_stats()] == [
+        (None, "default"),
+        ("OLD_BAR", "deprecated"),
+        ("BAZ", "source"),
+    ]
+
+
+def test_env_load_stats_disabled():
+    class Config(Env):
+        foo = Env.var(int, "foo", default=1)
+
+    assert Config({"FOO": "2"}).load_stats() == []
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_env_read_tracking(lazy):
+    class Config(Env):
+        __track_reads__ = True
+
+        foo = Env.var(int, "foo", default=1)
+        bar = Env.var(int, "bar", default=2)
+        unused = Env.var(int, "unused", default=3)
+        double = Env.der(int, lambda c: c.foo * 2)
+
+        class Service(Env):
+            __item__ = "service"
+
+            port = Env.var(int, "port", default=80)
+            host = Env.var(str, "host", default="localhost")
+
+    config = Config({"FOO": "5"}, lazy=lazy)
+    assert "foo" not in config.__dict__
+    for _ in range(3):
+        assert config.bar == 2
+    assert config.double == 10
+    assert config.service.port == 80
+
+    assert config.read_counts() == {
+        "foo": 1,
+        "bar": 3,
+        "unused": 0,
+        "double": 1,
+        "service.port": 1,
+        "service.host": 0,
+    }
+    assert config.access_report(top=2) == (
+        ["unused", "service.host"],
+        [("bar", 3), ("foo", 1)],
+    )
+
+    # Overrides are tracked too, and still invalidate the derived items.
+    config.foo = 6
+    assert "foo" not in config.__dict__
+    assert config.double == 12
+    assert config.read_counts()["foo"] == 2
+
+    config.reload({"FOO": "7"})
+    assert config.double == 14
+
+
+def test_env_read_tracking_disabled():
+    class Config(Env):
+        foo = Env.var(int, "foo", default=1)
+
+    config = Config()
+    assert config.foo == 1
+    assert config.read_counts() == {} and config.access_report() == ([], [])
+
+
+def test_env_items_slots():
+    class Config(Env):
+        foo = Env.var(int, "foo", default=1)
+        bar = Env.var(int, "bar", default=2)
+        baz = Env.der(int, lambda c: c.foo + c.bar)
+
+    assert not hasattr(Config.foo, "__dict__")
+    assert not hasattr(Config.baz, "__dict__")
+
+    # Casters that only depend on the type are shared.
+    assert Config.foo._cast is Config.bar._cast
+    assert Config({"BAR": "3"}).baz == 4
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_env_snapshot(lazy):
+    class Config(Env):
+        __prefix__ = "myapp"
+
+        port = Env.var(int, "port", default=8080)
+        tags = Env.var(list, "tags", default=[])
+        double = Env.der(int, lambda c: c.port * 2)
+        url = Env.der(str, lambda c: f"{c.service.host}:{c.port}", lazy=True)
+
+        class Service(Env):
+            __item__ = __prefix__ = "service"
+
+            host = Env.var(str, "host", default="localhost", validator=lambda _: None)
+
+    source = {"MYAPP_PORT": "80", "MYAPP_TAGS": "a,b"}
+    snapshot = Config(source, lazy=lazy).snapshot()
+    snapshot = pickle.loads(pickle.dumps(snapshot))
+
+    def fail(*args):
+        raise AssertionError("the snapshot should not be parsed or validated")
+
+    with mock.patch.object(EnvVariable, "_load", fail), mock.patch.object(
+        EnvVariable, "_validate", fail
+    ):
+        config = Config.from_snapshot(snapshot, source)
+    assert (config.port, config.tags, config.double) == (80, ["a", "b"], 160)
+    assert config.url == "localhost:80" and config.service.host == "localhost"
+    assert config.__dict__["double"] == 160
+
+    # The instances restored from a snapshot do not share their collections.
+    config.tags.append("c")
+    assert Config.from_snapshot(snapshot, source).tags == ["a", "b"]
+    assert snapshot.values[1] == ["a", "b"]
+
+    # The restored instance behaves like a loaded one.
+    config.port = 90
+    assert config.double == 180 and config.url == "localhost:90"
+    source["MYAPP_PORT"] = "70"
+    assert config.reload() == ["port", "double", "url"]
+
+    # Stale snapshots are rejected.
+    with pytest.raises(ValueError, match="source has changed"):
+        Config.from_snapshot(snapshot, source)
+    Config.service.extra = Env.var(int, "extra", default=0)
+    with pytest.raises(ValueError, match="different spec"):
+        Config.from_snapshot(snapshot, {"MYAPP_PORT": "80", "MYAPP_TAGS": "a,b"})
+    with pytest.raises(ValueError, match="version"):
+        Config.from_snapshot(snapshot._replace(version=0))
+
+
+def test_env_snapshot_spec_stable():
+    script = """if True:
+        from envier import Env
+
+        class Config(Env):
+            tags = Env.var(frozenset, "tags", default=frozenset("abcdefgh"))
+            sentinel = Env.var(object, "sentinel", default=object())
+            extra = Env.var(dict, "extra", default={"a": {1, 2, 3}, "b": "c"})
+
+        print(Config().snapshot().spec)
+    """
+
+    def spec(seed):
+        env = dict(os.environ, PYTHONHASHSEED=str(seed))
+        return subprocess.check_output([sys.executable, "-c", script], env=env)
+
+    assert spec(1) == spec(2)
+
+
+def test_env_file_cached(tmp_path):
+    class Config(Env):
+        __prefix__ = "myapp"
+
+        port = Env.var(int, "port", default=8080)
+        tags = Env.var(list, "tags", default=[])
+        double = Env.der(int, lambda c: c.port * 2)
+
+    path = str(tmp_path / "config.cache")
+    source = {"MYAPP_PORT": "80", "MYAPP_TAGS": "a,b"}
+    config = Config.file_cached(path, source)
+    assert (config.port, config.tags, config.double) == (80, ["a", "b"], 160)
+    assert [p.name for p in tmp_path.iterdir()] == ["config.cache"]
+
+    def fail(*args):
+        raise AssertionError("the cached values should not be parsed")
+
+    with mock.patch.object(EnvVariable, "_load", fail):
+        config = Config.file_cached(path, source)
+    assert (config.port, config.tags, config.double) == (80, ["a", "b"], 160)
+
+    # Stale and corrupted files are replaced.
+    source["MYAPP_PORT"] = "90"
+    assert Config.file_cached(path, source).double == 180
+    with open(path, "r+b") as f:
+        f.seek(-1, 2)
+        f.write(b"\0")
+    assert Config.file_cached(path, source).double == 180
+    with mock.patch.object(EnvVariable, "_load", fail):
+        assert Config.file_cached(path, source).double == 180
+
+    # Failing to write the file does not fail the load.
+    with pytest.warns(RuntimeWarning, match="Cannot cache"):
+        config = Config.file_cached(str(tmp_path / "missing" / "cache"), source)
+    assert config.port == 90
+    Config.handler = Env.der(object, lambda c: lambda: None)
+    with pytest.warns(RuntimeWarning, match="Cannot cache"):
+        assert Config.file_cached(path, source).port == 90
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX only")
+def test_env_file_cached_untrusted(tmp_path):
+    class Config(Env):
+        port = Env.var(int, "port", default=8080)
+
+    path = str(tmp_path / "config.cache")
+    assert Config.file_cached(path, {"PORT": "80"}).port == 80
+
+    # Files that others can write to are not unpickled.
+    os.chmod(path, 0o666)
+    with mock.patch.object(pickle, "loads") as loads, pytest.warns(
+        RuntimeWarning, match="not owned by the current user, or is writable"
+    ):
+        assert Config.file_cached(path, {"PORT": "80"}).port == 80
+    loads.assert_not_called()
+
+    # The file is replaced with a trusted one.
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert Config.file_cached(path, {"PORT": "80"}).port == 80
+
+
+def test_env_publish():
+    class Config(Env):
+        __prefix__ = "myapp"
+
+        hosts = Env.var(list, "hosts", default=[])
+        ports = Env.var(tuple, "ports", map=int, default=())
+        tags = Env.var(set, "tags", default=set())
+        roles = Env.var(frozenset, "roles", default=frozenset())
+        weights = Env.var(dict, "weights", map=lambda k, v: (k, float(v)), default={})
+        names = Env.var(list, "names", default=["x"])
+        count = Env.der(int, lambda c: len(c.hosts))
+
+        class Service(Env):
+            __item__ = __prefix__ = "service"
+
+            aliases = Env.var(set, "aliases", default=set())
+
+    source = {
+        "MYAPP_HOSTS": "b.com,a.com,é.com",
+        "MYAPP_PORTS": "80,-1,443",
+        "MYAPP_TAGS": "z,y",
+        "MYAPP_ROLES": "r,q",
+        "MYAPP_WEIGHTS": "b:0.5,a:1.5",
+        "MYAPP_SERVICE_ALIASES": "s1,s2",
+    }
+    memory = Config(source).publish(min_items=2)
+    try:
+        config = Config.attach(memory.name, source)
+
+        assert config.hosts == ["b.com", "a.com", "é.com"]
+        assert config.hosts[-1] == "é.com" and config.hosts[1:] == ["a.com", "é.com"]
+        assert config.ports == (80, -1, 443) and -1 in config.ports
+        assert config.tags == {"y", "z"} and "z" in config.tags and 1 not in config.tags
+        # Tuples and frozensets remain hashable.
+        assert {config.ports: 1}[(80, -1, 443)] == 1
+        assert {config.roles: 1}[frozenset({"q", "r"})] == 1
+        assert config.weights == {"a": 1.5, "b": 0.5} and config.weights["b"] == 0.5
+        assert "c" not in config.weights and config.weights.get(1) is None
+        assert config.service.aliases == {"s1", "s2"}
+        # Small collections and scalars are copied.
+        assert config.names == ["x"] and type(config.names) is list
+        assert config.count == 3
+
+        # The views are read-only, and can be exported.
+        with pytest.raises(TypeError):
+            config.hosts[0] = "c.com"  # type: ignore[index]
+        snapshot = pickle.loads(pickle.dumps(config.snapshot()))
+        restored = Config.from_snapshot(snapshot, source)
+        assert type(restored.hosts) is list and type(restored.tags) is frozenset
+        assert type(restored.ports) is tuple and type(restored.roles) is frozenset
+
+        with pytest.raises(ValueError, match="source has changed"):
+            Config.attach(memory.name, {})
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def test_env_attach_subprocess():
+    script = """if True:
+        import sys
+
+        from envier import Env
+
+        def test_env_attach_subprocess():
+            class Config(Env):
+                hosts = Env.var(list, "hosts", default=[])
+
+            return Config
+
+        source = {"HOSTS": ",".join(map(str, range(100)))}
+        config = test_env_attach_subprocess().attach(sys.argv[1], source)
+        print(config.hosts[-1])
+    """
+
+    class Config(Env):
+        hosts = Env.var(list, "hosts", default=[])
+
+    source = {"HOSTS": ",".join(map(str, range(100)))}
+    memory = Config(source).publish()
+    try:
+        # The segment outlives the independent processes that attach to it.
+        for _ in range(2):
+            command = [sys.executable, "-c", script, memory.name]
+            assert subprocess.check_output(command).strip() == b"99"
+        assert Config.attach(memory.name, source).hosts[-1] == "99"
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_env_freeze(lazy):
+    class Config(Env):
+        __prefix__ = "myapp"
+
+        hosts = Env.var(list, "hosts", default=[])
+        tags = Env.var(set, "tags", default=set())
+        weights = Env.var(dict, "weights", default={})
+        extra = Env.der(list, lambda c: c.hosts + ["c.com"])
+
+        class Service(Env):
+            __item__ = __prefix__ = "service"
+
+            nested = Env.var(dict, "nested", default={"a": [1, {2}]})
+
+    source = {"MYAPP_HOSTS": "a.com,b.com", "MYAPP_TAGS": "x", "MYAPP_WEIGHTS": "a:1"}
+    config = Config(source, lazy=lazy)
+    assert config.freeze() is config
+
+    assert config.hosts == ("a.com", "b.com")
+    assert config.extra == ("a.com", "b.com", "c.com")
+    assert config.tags == frozenset({"x"})
+    assert config.weights == {"a": "1"}
+    assert config.service.nested["a"] == (1, frozenset({2}))
+    with pytest.raises(TypeError):
+        config.weights["b"] = "2"
+    with pytest.raises(AttributeError, match="frozen"):
+        config.hosts = ()
+    with pytest.raises(AttributeError, match="frozen"):
+        config.service.nested = {}
+    with pytest.raises(RuntimeError, match="frozen"):
+        config.reload()
+
+    # Frozen configurations can still be exported.
+    snapshot = pickle.loads(pickle.dumps(config.snapshot()))
+    restored = Config.from_snapshot(snapshot, source)
+    assert restored.hosts == ("a.com", "b.com") and restored.weights == {"a": "1"}
+    assert restored.service.nested == {"a": (1, frozenset({2}))}
+    memory = config.publish(min_items=1)
+    try:
+        attached = Config.attach(memory.name, source)
+        assert attached.hosts == ("a.com", "b.com") and attached.weights == {"a": "1"}
+        assert attached.extra == ("a.com", "b.com", "c.com")
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def test_env_freeze_gc():
+    class Config(Env):
+        hosts = Env.var(list, "hosts", default=[])
+
+    config = Config({"HOSTS": "a,b"})
+    try:
+        config.freeze(gc_freeze=True)
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
+
+
+@pytest.mark.parametrize("chunk_size", [None, 4])
+def test_env_large_collections(chunk_size):
+    class Config(Env):
+        items = Env.var(list, "items", default=[])
+        ints = Env.var(list, "ints", map=int, default=[])
+        entries = Env.var(tuple, "entries", default=())
+        tags = Env.var(frozenset, "tags", default=frozenset())
+        mapping = Env.var(dict, "mapping", default={})
+        mapped = Env.var(
+            dict, "mapped", map=lambda k, v: (k.upper(), int(v)), default={}
+        )
+        ports = Env.var(array.array, "ports", map=int, default=array.array("q"))
+        buckets = Env.var(array.array, "buckets", map=float, default=array.array("d"))
+
+    source = {
+        "ITEMS": "abc,defgh,,i,jklmn,op",
+        "INTS": "1,22,333,4444,5,66",
+        "ENTRIES": "abc,defgh,,i,jklmn,op",
+        "TAGS": "a,bcd,a,efgh,i",
+        "MAPPING": "a:1,bcd:2:3,a:4,efgh:5",
+        "MAPPED": "a:1,bcd:2,a:4,efgh:5",
+        "PORTS": "8000,8001,-8002,8003,80",
+        "BUCKETS": "0.1,0.25,1e3",
+    }
+    with mock.patch("envier.env._SPLIT_CHUNK_SIZE", chunk_size or 2**16):
+        config = Config(source)
+
+    assert config.items == ["abc", "defgh", "", "i", "jklmn", "op"]
+    assert config.ints == [1, 22, 333, 4444, 5, 66]
+    assert config.entries == ("abc", "defgh", "", "i", "jklmn", "op")
+    assert config.tags == frozenset({"a", "bcd", "efgh", "i"})
+    assert config.mapping == {"a": "4", "bcd": "2:3", "efgh": "5"}
+    assert config.mapped == {"A": 4, "BCD": 2, "EFGH": 5}
+    assert config.ports == array.array("q", [8000, 8001, -8002, 8003, 80])
+    assert config.buckets == array.array("d", [0.1, 0.25, 1000.0])
+    frozen = Config(source).freeze()
+    assert frozen.ports.readonly and frozen.ports.tolist() == config.ports.tolist()
+
+    with pytest.raises(TypeError, match="map=int or map=float"):
+        Env.var(array.array, "bytes", map=bytes)
+
+
+def test_env_numeric_types():
+    class Config(Env):
+        ports = Env.var(range, "ports", default=range(0))
+        codes = Env.var(IntArray, "codes", default=IntArray(), cache=4)
+        buckets = Env.var(FloatArray, "buckets", default=FloatArray())
+        scaled = Env.var(
+            IntArray, "scaled", map=lambda _: int(_) * 10, default=IntArray()
+        )
+
+    source = {"PORTS": "8000-8999", "CODES": "1,-2,3", "BUCKETS": "0.5,1e3"}
+    config = Config(source)
+    assert config.ports == range(8000, 9000) and 8999 in config.ports
+    assert type(config.codes) is IntArray and config.codes.tolist() == [1, -2, 3]
+    assert config.buckets == FloatArray([0.5, 1000.0])
+    assert config.scaled == IntArray()
+
+    for raw, expected in (("80", range(80, 81)), (" -5 - -1 ", range(-5, 0))):
+        assert Config({"PORTS": raw}).ports == expected
+    for raw in ("", "80-", "a-b", "9000-8000"):
+        with pytest.raises(TypeError, match="cannot cast"):
+            Config({"PORTS": raw})
+    with pytest.raises(ValueError):
+        Config({"CODES": "1.5"})
+
+    # Cached arrays are copied, and keep their type.
+    config.codes.append(4)
+    assert Config(source).codes == IntArray([1, -2, 3])
+    assert type(Config(source).codes) is IntArray
+    assert pickle.loads(pickle.dumps(config.codes)) == IntArray([1, -2, 3, 4])
+
+    memory = Config({**source, "SCALED": "1,2"}).publish(min_items=2)
+    try:
+        attached = Config.attach(memory.name, {**source, "SCALED": "1,2"})
+        assert list(attached.scaled) == [10, 20]
+        assert attached.ports == range(8000, 9000)
+    finally:
+        memory.close()
+        memory.unlink()
+    frozen = Config(source).freeze()
+    assert frozen.codes.readonly and frozen.codes.tolist() == [1, -2, 3]
+    snapshot = pickle.loads(pickle.dumps(frozen.snapshot()))
+    restored = Config.from_snapshot(snapshot, source)
+    assert type(restored.codes) is IntArray and restored.codes == IntArray([1, -2, 3])
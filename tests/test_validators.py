@@ -1,8 +1,12 @@
+import copy
+import pickle
 import typing as t
 
 import pytest
 
 from envier import En
+from envier import FloatArray
+from envier import IntArray
 from envier import validators as v
 
 
@@ -62,3 +66,68 @@ def test_range(monkeypatch):
         excinfo.value.args[0]
         == "Invalid value for environment variable SIZE: value must be in range [0, 100]"
     )
+
+
+class ArrayConfig(En):
+    ports = En.v(range, "PORTS", default=range(0), validator=v.range(1024, 65535))
+    codes = En.v(IntArray, "CODES", default=IntArray(), validator=v.choice([1, 2, 3]))
+    buckets = En.v(
+        FloatArray, "BUCKETS", default=FloatArray(), validator=v.range(0, 100)
+    )
+
+
+@pytest.mark.parametrize(
+    "name,raw,message",
+    [
+        ("PORTS", "80-8080", "value must be in range [1024, 65535]"),
+        ("PORTS", "60000-70000", "value must be in range [1024, 65535]"),
+        ("CODES", "1,2,4", "value must be one of [1, 2, 3]"),
+        ("BUCKETS", "0.5,100.5", "value must be in range [0, 100]"),
+    ],
+)
+def test_ranges_and_arrays(monkeypatch, name, raw, message):
+    assert ArrayConfig().ports == range(0)
+
+    monkeypatch.setenv("PORTS", "8000-8999")
+    monkeypatch.setenv("CODES", "1,3")
+    monkeypatch.setenv("BUCKETS", "0.5,99.5")
+    config = ArrayConfig()
+    assert (config.ports, list(config.codes), list(config.buckets)) == (
+        range(8000, 9000),
+        [1, 3],
+        [0.5, 99.5],
+    )
+
+    monkeypatch.setenv(name, raw)
+    with pytest.raises(ValueError) as excinfo:
+        ArrayConfig()
+
+    assert excinfo.value.args[0] == (
+        f"Invalid value for environment variable {name}: {message}"
+    )
+
+
+def test_choice_ranges():
+    # Ranges are not checked item by item.
+    huge = range(10**18)
+    v.choice(range(-1, 10**18))(huge)
+    with pytest.raises(ValueError) as excinfo:
+        v.choice(range(1, 10**18))(huge)
+    assert excinfo.value.args[0] == "value must be one of range(1, 1000000000000000000)"
+    with pytest.raises(ValueError):
+        v.choice([1, 2, 3])(huge)
+
+    v.choice({1, 2, 3, 5})(range(1, 4))
+    with pytest.raises(ValueError):
+        v.choice({1, 2, 4, 5})(range(1, 4))
+
+
+def test_array_copies():
+    codes = IntArray([1, 2, 3])
+    for copied in (copy.copy(codes), copy.deepcopy(codes)):
+        assert type(copied) is IntArray and copied == codes and copied is not codes
+
+    buckets = FloatArray([0.5])
+    for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+        loaded = pickle.loads(pickle.dumps(buckets, protocol))
+        assert type(loaded) is FloatArray and loaded == buckets